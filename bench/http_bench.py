@@ -0,0 +1,177 @@
+"""
+HTTP throughput benchmark for the shop under WSGI and ASGI.
+
+Starts each server in turn, drives it with keep-alive clients at several
+concurrency levels and prints requests per second and latency percentiles:
+
+    python bench/http_bench.py --concurrency 50 200 1000 --duration 30
+
+The default server commands need gunicorn and uvicorn installed; override
+them with --wsgi-cmd / --asgi-cmd, or pass --no-server to benchmark a server
+that is already running on --host/--port. Raise the open files limit
+(ulimit -n) above the highest concurrency level first.
+"""
+import argparse
+import asyncio
+import os
+import shlex
+import socket
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+DEFAULT_PATHS = ['/', '/api/categories/']
+WSGI_CMD = 'gunicorn shop.wsgi:application --bind {host}:{port} ' \
+    '--workers {workers} --threads 8 --worker-class gthread'
+ASGI_CMD = 'uvicorn shop.asgi:application --host {host} --port {port} ' \
+    '--workers {workers} --no-access-log'
+
+
+async def read_response(reader):
+    head = await reader.readuntil(b'\r\n\r\n')
+    lines = head.decode('latin-1').split('\r\n')
+    status = int(lines[0].split()[1])
+    headers = {}
+    for line in lines[1:]:
+        if ':' in line:
+            name, value = line.split(':', 1)
+            headers[name.strip().lower()] = value.strip()
+    if headers.get('transfer-encoding') == 'chunked':
+        while True:
+            size = int((await reader.readuntil(b'\r\n')).split(b';')[0], 16)
+            await reader.readexactly(size + 2)
+            if size == 0:
+                break
+    else:
+        await reader.readexactly(int(headers.get('content-length', 0)))
+    return status, headers.get('connection') == 'close'
+
+
+async def client(host, port, paths, deadline, latencies, errors):
+    reader = writer = None
+    i = 0
+    while time.monotonic() < deadline:
+        path = paths[i % len(paths)]
+        i += 1
+        request = (
+            f'GET {path} HTTP/1.1\r\nHost: {host}\r\n'
+            'Connection: keep-alive\r\n\r\n'
+        ).encode()
+        started = time.monotonic()
+        try:
+            if writer is None:
+                reader, writer = await asyncio.open_connection(host, port)
+            writer.write(request)
+            status, close = await read_response(reader)
+        except (OSError, asyncio.IncompleteReadError, ValueError):
+            errors.append(path)
+            if writer is not None:
+                writer.close()
+            reader = writer = None
+            continue
+        latencies.append(time.monotonic() - started)
+        if status >= 400:
+            errors.append(path)
+        if close:
+            writer.close()
+            reader = writer = None
+    if writer is not None:
+        writer.close()
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+async def run_load(host, port, paths, concurrency, duration):
+    latencies = []
+    errors = []
+    deadline = time.monotonic() + duration
+    started = time.monotonic()
+    await asyncio.gather(*[
+        client(host, port, paths, deadline, latencies, errors)
+        for _ in range(concurrency)
+    ])
+    elapsed = time.monotonic() - started
+    return {
+        'requests': len(latencies),
+        'errors': len(errors),
+        'rps': len(latencies) / elapsed,
+        'p50': percentile(latencies, 50) * 1000,
+        'p99': percentile(latencies, 99) * 1000,
+    }
+
+
+def wait_for_port(host, port, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection((host, port), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f'server did not start on {host}:{port}')
+
+
+def benchmark(name, command, args):
+    server = None
+    if command:
+        server = subprocess.Popen(
+            shlex.split(command.format(
+                host=args.host, port=args.port, workers=args.workers
+            )),
+            cwd=BASE_DIR, env=dict(os.environ, PYTHONPATH=str(BASE_DIR)),
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+    try:
+        wait_for_port(args.host, args.port)
+        asyncio.run(run_load(args.host, args.port, args.paths, 10, args.warmup))
+        for concurrency in args.concurrency:
+            result = asyncio.run(run_load(
+                args.host, args.port, args.paths, concurrency, args.duration
+            ))
+            print(
+                f'{name:<6} {concurrency:>6} {result["requests"]:>9} '
+                f'{result["errors"]:>7} {result["rps"]:>9.1f} '
+                f'{result["p50"]:>9.1f} {result["p99"]:>9.1f}',
+                flush=True
+            )
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().split('\n')[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--paths', nargs='+', default=DEFAULT_PATHS)
+    parser.add_argument('--concurrency', nargs='+', type=int,
+                        default=[50, 200, 1000])
+    parser.add_argument('--duration', type=float, default=30)
+    parser.add_argument('--warmup', type=float, default=5)
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--wsgi-cmd', default=WSGI_CMD)
+    parser.add_argument('--asgi-cmd', default=ASGI_CMD)
+    parser.add_argument('--modes', nargs='+', choices=('wsgi', 'asgi'),
+                        default=['wsgi', 'asgi'])
+    parser.add_argument('--no-server', action='store_true',
+                        help='benchmark an already running server')
+    args = parser.parse_args()
+
+    print(f'{"mode":<6} {"conc":>6} {"requests":>9} {"errors":>7} '
+          f'{"rps":>9} {"p50 ms":>9} {"p99 ms":>9}')
+    for mode in args.modes:
+        command = None if args.no_server else getattr(args, f'{mode}_cmd')
+        benchmark(mode, command, args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,10 +1,163 @@
 from django.contrib import admin
+from django.db.models import Q
 
 from .models import *
+from .pagination import EstimatedCountPaginator
+from .search import get_search_backend
 
-admin.site.register(Cart)
-admin.site.register(CartProduct)
-admin.site.register(Category)
-admin.site.register(Customer)
-admin.site.register(Order)
-admin.site.register(Product)
+
+class LargeTableAdmin(admin.ModelAdmin):
+    # search_fields are matched exactly, and numeric_search_fields only
+    # against numeric terms, so that every search can use an index.
+
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    numeric_search_fields = ()
+
+    def get_search_fields(self, request):
+        return (*self.search_fields, *self.numeric_search_fields)
+
+    def get_search_condition(self, term):
+        condition = Q()
+        for field in self.search_fields:
+            condition |= Q(**{field: term})
+        if term.isdigit():
+            for field in self.numeric_search_fields:
+                condition |= Q(**{field: int(term)})
+        return condition
+
+    def get_search_results(self, request, queryset, search_term):
+        term = search_term.strip()
+        if not term:
+            return queryset, False
+        condition = self.get_search_condition(term)
+        if not condition:
+            return queryset.none(), False
+        return queryset.filter(condition), False
+
+
+@admin.register(Category)
+class CategoryAdmin(admin.ModelAdmin):
+
+    list_display = ('name', 'slug')
+    search_fields = ('name',)
+
+
+@admin.register(Product)
+class ProductAdmin(LargeTableAdmin):
+
+    list_display = ('title', 'slug', 'category', 'price')
+    list_select_related = ('category',)
+    list_filter = ('category',)
+    search_fields = ('slug',)
+    numeric_search_fields = ('id',)
+    autocomplete_fields = ('category',)
+    title_search_limit = 1000
+
+    def get_search_condition(self, term):
+        # Titles are searched through the full-text index, not a scan.
+        ids = get_search_backend().search(term, self.title_search_limit)
+        return super().get_search_condition(term) | Q(id__in=ids)
+
+
+@admin.register(ProductFeatures)
+class ProductFeaturesAdmin(admin.ModelAdmin):
+
+    list_display = ('feature_name', 'feature_key', 'category')
+    list_filter = ('category',)
+    search_fields = ('feature_name', 'feature_key')
+    autocomplete_fields = ('category',)
+
+    def get_queryset(self, request):
+        # __str__ reads the category, also for autocomplete results
+        return super().get_queryset(request).select_related('category')
+
+
+@admin.register(ProductFeatureValues)
+class ProductFeatureValuesAdmin(LargeTableAdmin):
+
+    list_display = ('product', 'feature', 'value')
+    list_select_related = ('product', 'feature__category')
+    search_fields = ('product__slug',)
+    numeric_search_fields = ('product_id',)
+    raw_id_fields = ('product',)
+    autocomplete_fields = ('feature',)
+
+
+@admin.register(Customer)
+class CustomerAdmin(LargeTableAdmin):
+
+    list_display = ('id', 'user', 'phone')
+    list_select_related = ('user',)
+    search_fields = ('user__username',)
+    numeric_search_fields = ('id',)
+    raw_id_fields = ('user',)
+
+
+@admin.register(Cart)
+class CartAdmin(LargeTableAdmin):
+
+    list_display = ('id', 'owner_id', 'total_products', 'final_price',
+                    'in_order')
+    list_filter = ('in_order',)
+    numeric_search_fields = ('id', 'owner_id')
+    raw_id_fields = ('owner',)
+
+
+@admin.register(CartProduct)
+class CartProductAdmin(LargeTableAdmin):
+
+    list_display = ('id', 'product', 'cart_id', 'qty', 'final_price')
+    list_select_related = ('product',)
+    numeric_search_fields = ('cart_id',)
+    raw_id_fields = ('user', 'cart', 'product')
+
+
+class ReadOnlyOrderLinesMixin:
+    # Order lines are what the customer bought. Changing them would leave
+    # the order's summary, totals and the sales rollups out of date.
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+class OrderProductInline(ReadOnlyOrderLinesMixin, admin.TabularInline):
+
+    model = OrderProduct
+    extra = 0
+    fields = ('title', 'price', 'qty', 'final_price')
+
+
+@admin.register(Order)
+class OrderAdmin(LargeTableAdmin):
+
+    list_display = ('id', 'customer', 'status', 'buying_type', 'created_at',
+                    'final_price')
+    list_select_related = ('customer__user',)
+    list_filter = ('status',)
+    numeric_search_fields = ('id', 'customer_id')
+    raw_id_fields = ('customer', 'cart')
+    readonly_fields = ('total_products', 'final_price')
+    inlines = (OrderProductInline,)
+
+
+@admin.register(OrderProduct)
+class OrderProductAdmin(ReadOnlyOrderLinesMixin, LargeTableAdmin):
+
+    list_display = ('id', 'title', 'order_id', 'qty', 'final_price')
+    numeric_search_fields = ('order_id',)
+    raw_id_fields = ('order', 'product')
+
+
+@admin.register(OutboxEvent)
+class OutboxEventAdmin(LargeTableAdmin):
+
+    list_display = ('id', 'topic', 'status', 'attempts', 'available_at')
+    list_filter = ('status',)
+    numeric_search_fields = ('id',)
@@ -1,8 +1,26 @@
-from rest_framework.generics import ListAPIView
-from rest_framework.pagination import PageNumberPagination
+from django.db.models import prefetch_related_objects
+from django.http import StreamingHttpResponse
+from rest_framework import status
+from rest_framework.generics import ListAPIView, get_object_or_404
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+from rest_framework.permissions import IsAdminUser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+from rest_framework.views import APIView
 
-from ..models import Category, Customer
-from .serializers import CategorySerializer, CustomerSerializer
+from ..cart import apply_cart_operations
+from ..catalog_cache import catalog_cache
+from ..db.pool import get_pool_stats
+from ..exports import (ORDER_EXPORT_DATE_FIELDS, get_order_rows, iter_csv,
+                       iter_ndjson)
+from ..facets import FacetIndex, get_facets, parse_filters
+from ..mixins import CartMixin, ProductPageMixin, SearchMixin
+from ..models import Category, Customer, Product
+from ..rollups import REPORT_GROUPS, get_sales_report
+from ..utils import chunked, parse_date_or_none
+from .serializers import (CartBatchSerializer, CartSerializer,
+                          CategorySerializer, CustomerSerializer,
+                          ProductCardSerializer)
 
 
 class CategoryPagination(PageNumberPagination):
@@ -19,7 +37,163 @@ class CategoryListAPIView(ListAPIView):
     queryset = Category.objects.all()
 
 
+class CustomerPagination(CursorPagination):
+
+    page_size = 100
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
+    ordering = 'id'
+
+
 class CustomersListAPIView(ListAPIView):
 
     serializer_class = CustomerSerializer
-    queryset = Customer.objects.all()
+    pagination_class = CustomerPagination
+    queryset = Customer.objects.prefetch_related('related_orders')
+
+
+class CustomersStreamAPIView(APIView):
+
+    permission_classes = [IsAdminUser]
+    chunk_size = 2000
+
+    def stream(self):
+        renderer = JSONRenderer()
+        queryset = Customer.objects.order_by('id')
+        for chunk in chunked(queryset.iterator(chunk_size=self.chunk_size),
+                             self.chunk_size):
+            prefetch_related_objects(chunk, 'related_orders')
+            for customer in chunk:
+                yield renderer.render(CustomerSerializer(customer).data) + b'\n'
+
+    def get(self, request, *args, **kwargs):
+        return StreamingHttpResponse(
+            self.stream(), content_type='application/x-ndjson'
+            )
+
+
+class OrdersExportAPIView(APIView):
+
+    permission_classes = [IsAdminUser]
+    content_types = {
+        'csv': 'text/csv; charset=utf-8',
+        'ndjson': 'application/x-ndjson',
+    }
+
+    def get(self, request, *args, **kwargs):
+        output = request.query_params.get('output', 'csv')
+        date_field = request.query_params.get('date_field', 'created_at')
+        errors = {}
+        if output not in self.content_types:
+            errors['output'] = ['Допустимые значения: csv, ndjson']
+        if date_field not in ORDER_EXPORT_DATE_FIELDS:
+            errors['date_field'] = ['Допустимые значения: created_at, order_date']
+        dates = {}
+        for param in ('from', 'to'):
+            value = request.query_params.get(param)
+            dates[param] = parse_date_or_none(value) if value else None
+            if value and dates[param] is None:
+                errors[param] = ['Ожидается дата в формате ГГГГ-ММ-ДД']
+        if errors:
+            return Response(errors, status=status.HTTP_400_BAD_REQUEST)
+        rows = get_order_rows(date_field, dates['from'], dates['to'])
+        lines = iter_csv(rows) if output == 'csv' else iter_ndjson(rows)
+        response = StreamingHttpResponse(
+            (line.encode('utf-8') for line in lines),
+            content_type=self.content_types[output]
+            )
+        response['Content-Disposition'] = \
+            f'attachment; filename="orders.{output}"'
+        return response
+
+
+class SalesReportAPIView(APIView):
+
+    permission_classes = [IsAdminUser]
+
+    def get(self, request, *args, **kwargs):
+        group = request.query_params.get('group', 'day')
+        errors = {}
+        if group not in REPORT_GROUPS:
+            errors['group'] = [
+                'Допустимые значения: ' + ', '.join(REPORT_GROUPS)
+            ]
+        dates = {}
+        for param in ('from', 'to'):
+            value = request.query_params.get(param)
+            dates[param] = parse_date_or_none(value) if value else None
+            if value and dates[param] is None:
+                errors[param] = ['Ожидается дата в формате ГГГГ-ММ-ДД']
+        if errors:
+            return Response(errors, status=status.HTTP_400_BAD_REQUEST)
+        return Response(get_sales_report(group, dates['from'], dates['to']))
+
+
+class CartBatchAPIView(CartMixin, APIView):
+
+    def post(self, request, *args, **kwargs):
+        serializer = CartBatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        operations = serializer.validated_data['operations']
+        slugs = {operation['slug'] for operation in operations}
+        products = Product.objects.in_bulk(slugs, field_name='slug')
+        missing = sorted(slugs - products.keys())
+        if missing:
+            return Response(
+                {'slug': [f'Товар {slug} не найден' for slug in missing]},
+                status=status.HTTP_400_BAD_REQUEST
+                )
+        if not apply_cart_operations(self.cart, operations, products):
+            return Response(
+                {'detail': 'Корзина уже оформлена'},
+                status=status.HTTP_409_CONFLICT
+                )
+        return Response(CartSerializer(self.cart.resolve()).data)
+
+
+class CatalogCacheStatsAPIView(APIView):
+
+    permission_classes = [IsAdminUser]
+
+    def get(self, request, *args, **kwargs):
+        return Response(catalog_cache.stats())
+
+
+class DatabasePoolStatsAPIView(APIView):
+
+    permission_classes = [IsAdminUser]
+
+    def get(self, request, *args, **kwargs):
+        return Response(get_pool_stats())
+
+
+class CategoryProductsAPIView(ProductPageMixin, APIView):
+
+    def get(self, request, *args, **kwargs):
+        category = get_object_or_404(Category, slug=kwargs['slug'])
+        index = FacetIndex.for_category(category)
+        filters, price_min, price_max = parse_filters(category, request.GET)
+        sort = self.get_sort()
+        products = index.get_page(
+            index.match(filters, price_min, price_max), sort,
+            request.GET.get('cursor'), self.paginate_by
+            )
+        return Response({
+            'products': ProductCardSerializer(products, many=True).data,
+            'next_cursor': products.next_cursor,
+            'facets': get_facets(
+                category, index, filters, price_min, price_max
+                ),
+        })
+
+
+class SearchAPIView(SearchMixin, APIView):
+
+    def get(self, request, *args, **kwargs):
+        query, page, products, has_next = self.get_search_page()
+        return Response({
+            'query': query,
+            'page': page,
+            'has_next': has_next,
+            'products': ProductCardSerializer(products, many=True).data,
+        })
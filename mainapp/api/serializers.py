@@ -1,6 +1,7 @@
 from rest_framework import serializers
 
-from ..models import Category, Customer, Order
+from ..cart import CART_OP_CHOICES, CART_OP_SET_QTY, get_cart_lines
+from ..models import Category, Customer, Order, Product
 
 
 class CategorySerializer(serializers.ModelSerializer):
@@ -32,13 +33,64 @@ class OrderSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Order
-        fields = '__all__'
+        fields = [
+            'id', 'customer', 'first_name', 'last_name', 'phone', 'cart',
+            'address', 'status', 'buying_type', 'comment', 'created_at',
+            'order_date'
+        ]
 
 
 class CustomerSerializer(serializers.ModelSerializer):
 
-    orders = OrderSerializer(many=True)
+    orders = OrderSerializer(many=True, source='related_orders')
 
     class Meta:
         model = Customer
-        fields = '__all__'
+        fields = ['id', 'user', 'phone', 'address', 'orders']
+
+
+class CartOperationSerializer(serializers.Serializer):
+
+    op = serializers.ChoiceField(choices=CART_OP_CHOICES)
+    slug = serializers.SlugField()
+    qty = serializers.IntegerField(min_value=1, required=False)
+
+    def validate(self, attrs):
+        if attrs['op'] == CART_OP_SET_QTY and 'qty' not in attrs:
+            raise serializers.ValidationError(
+                {'qty': 'Обязательное поле для операции set_qty.'}
+                )
+        return attrs
+
+
+class CartBatchSerializer(serializers.Serializer):
+
+    operations = CartOperationSerializer(many=True, allow_empty=False)
+
+
+class CartProductSerializer(serializers.Serializer):
+
+    slug = serializers.SlugField(source='product.slug')
+    title = serializers.CharField(source='product.title')
+    price = serializers.DecimalField(
+        source='product.price', max_digits=9, decimal_places=2
+        )
+    qty = serializers.IntegerField()
+    final_price = serializers.DecimalField(max_digits=9, decimal_places=2)
+
+
+class CartSerializer(serializers.Serializer):
+
+    total_products = serializers.IntegerField()
+    final_price = serializers.DecimalField(max_digits=9, decimal_places=2)
+    products = serializers.SerializerMethodField()
+
+    def get_products(self, obj):
+        return CartProductSerializer(get_cart_lines(obj), many=True).data
+
+
+class ProductCardSerializer(serializers.ModelSerializer):
+
+    class Meta:
+        model = Product
+        fields = Product.CARD_FIELDS
@@ -1,8 +1,30 @@
 from django.urls import path
 
-from .api_views import CategoryListAPIView, CustomersListAPIView
+from ..async_views import async_view
+from .api_views import (CartBatchAPIView, CatalogCacheStatsAPIView,
+                        CategoryListAPIView, CategoryProductsAPIView,
+                        CustomersListAPIView, CustomersStreamAPIView,
+                        DatabasePoolStatsAPIView, OrdersExportAPIView,
+                        SalesReportAPIView, SearchAPIView)
 
 urlpatterns = [
-    path('categories/', CategoryListAPIView.as_view(), name='categories'),
-    path('customers/', CustomersListAPIView.as_view(), name='customers_list')
+    path('categories/', async_view(CategoryListAPIView.as_view()),
+        name='categories'),
+    path('categories/<str:slug>/products/',
+        async_view(CategoryProductsAPIView.as_view()),
+        name='category_products'),
+    path('customers/', async_view(CustomersListAPIView.as_view()),
+        name='customers_list'),
+    path('customers/stream/', CustomersStreamAPIView.as_view(),
+        name='customers_stream'),
+    path('orders/export/', OrdersExportAPIView.as_view(),
+        name='orders_export'),
+    path('sales/', SalesReportAPIView.as_view(), name='sales_report'),
+    path('search/', async_view(SearchAPIView.as_view()),
+        name='search_api'),
+    path('cart/batch/', CartBatchAPIView.as_view(), name='cart_batch'),
+    path('catalog-cache/stats/', CatalogCacheStatsAPIView.as_view(),
+        name='catalog_cache_stats'),
+    path('db-pool/stats/', DatabasePoolStatsAPIView.as_view(),
+        name='db_pool_stats')
 ]
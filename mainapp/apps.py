@@ -3,3 +3,6 @@ from django.apps import AppConfig
 
 class MainappConfig(AppConfig):
     name = 'mainapp'
+
+    def ready(self):
+        from . import handlers, metrics, signals  # noqa: F401
@@ -0,0 +1,378 @@
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils.functional import SimpleLazyObject, empty
+
+from .models import Cart, CartProduct, Customer, Product
+from .utils import recalc_cart
+
+CART_SESSION_KEY = 'cart'
+ANONYMOUS_CART_SESSION_KEY = 'anonymous_cart'
+
+CART_OP_ADD = 'add'
+CART_OP_SET_QTY = 'set_qty'
+CART_OP_REMOVE = 'remove'
+
+CART_OP_CHOICES = (CART_OP_ADD, CART_OP_SET_QTY, CART_OP_REMOVE)
+
+
+class SessionCartProduct:
+
+    def __init__(self, product, qty):
+        self.product = product
+        self.qty = qty
+        self.final_price = qty * product.price
+
+
+class SessionCartProducts:
+
+    def __init__(self, items):
+        self._items = items
+
+    def __iter__(self):
+        return iter(self._items)
+
+    def all(self):
+        return self._items
+
+    def count(self):
+        return len(self._items)
+
+
+class SessionCart:
+
+    id = None
+    owner = None
+    owner_id = None
+    in_order = False
+
+    def __init__(self, session):
+        self.session = session
+        self._products = None
+
+    @property
+    def items(self):
+        return dict(self.session.get(ANONYMOUS_CART_SESSION_KEY, {}))
+
+    @property
+    def products(self):
+        if self._products is None:
+            items = self.items
+            products = Product.objects.filter(id__in=items)
+            self._products = SessionCartProducts([
+                SessionCartProduct(product, items[str(product.id)])
+                for product in products
+            ])
+        return self._products
+
+    @property
+    def total_products(self):
+        return len(self.items)
+
+    @property
+    def final_price(self):
+        return sum(item.final_price for item in self.products)
+
+    def save_items(self, items):
+        self.session[ANONYMOUS_CART_SESSION_KEY] = items
+        self._products = None
+
+    def add(self, product):
+        items = self.items
+        items.setdefault(str(product.id), 1)
+        self.save_items(items)
+
+    def set_qty(self, product, qty):
+        if qty <= 0:
+            self.remove(product)
+            return
+        items = self.items
+        items[str(product.id)] = qty
+        self.save_items(items)
+
+    def remove(self, product):
+        items = self.items
+        items.pop(str(product.id), None)
+        self.save_items(items)
+
+
+def get_session_cart_data(request):
+    data = request.session.get(CART_SESSION_KEY) or {}
+    if data.get('user_id') != request.user.pk:
+        return {}
+    return data
+
+
+def remember_cart(request, cart):
+    data = {'user_id': request.user.pk}
+    if cart.owner_id:
+        data['customer_id'] = cart.owner_id
+    if not cart.in_order:
+        data['cart_id'] = cart.id
+        data['total_products'] = cart.total_products
+    if request.session.get(CART_SESSION_KEY) != data:
+        request.session[CART_SESSION_KEY] = data
+
+
+def get_customer_cart(user, customer_id=None):
+    if not customer_id:
+        customer = Customer.objects.filter(user=user).first()
+        if not customer:
+            customer = Customer.objects.create(user=user)
+        customer_id = customer.id
+    cart = Cart.objects.filter(owner_id=customer_id, in_order=False).first()
+    if cart:
+        return cart
+    try:
+        with transaction.atomic():
+            return Cart.objects.create(owner_id=customer_id)
+    except IntegrityError:
+        # A concurrent request opened the cart first.
+        return Cart.objects.get(owner_id=customer_id, in_order=False)
+
+
+def resolve_cart(request):
+    if not request.user.is_authenticated:
+        return SessionCart(request.session)
+    data = get_session_cart_data(request)
+    if data.get('cart_id'):
+        cart = Cart.objects.filter(pk=data['cart_id'], in_order=False).first()
+        if cart:
+            return cart
+    return get_customer_cart(request.user, data.get('customer_id'))
+
+
+class LazyCart(SimpleLazyObject):
+
+    def __init__(self, request):
+        self.__dict__['_request'] = request
+        super().__init__(lambda: resolve_cart(request))
+
+    # Template variable lookups probe item access and isinstance() before
+    # reaching the attribute, neither of which should hit the database.
+    @property
+    def __class__(self):
+        if self._wrapped is empty:
+            return type(self)
+        return self._wrapped.__class__
+
+    def __getitem__(self, key):
+        raise TypeError("'Cart' object is not subscriptable")
+
+    @property
+    def total_products(self):
+        if self._wrapped is empty:
+            total = get_session_cart_data(self._request).get('total_products')
+            if total is not None:
+                return total
+            self._setup()
+        return self._wrapped.total_products
+
+    def resolve(self):
+        if self._wrapped is empty:
+            self._setup()
+        return self._wrapped
+
+    def sync_session(self):
+        if self._wrapped is empty or isinstance(self._wrapped, SessionCart):
+            return
+        remember_cart(self._request, self._wrapped)
+
+
+def unwrap_cart(cart):
+    if isinstance(cart, LazyCart):
+        return cart.resolve()
+    return cart
+
+
+def merge_session_cart(request, user):
+    items = request.session.get(ANONYMOUS_CART_SESSION_KEY)
+    if not items:
+        return
+    prices = dict(
+        Product.objects.filter(id__in=items).values_list('id', 'price')
+        )
+    with transaction.atomic():
+        cart = get_customer_cart(user)
+        while not lock_cart(cart):
+            # Ordered while we waited for the lock; merge into the new cart.
+            cart = get_customer_cart(user)
+        existing = {
+            cart_product.product_id: cart_product
+            for cart_product in cart.related_products.filter(
+                product_id__in=prices
+                )
+        }
+        updated, created = [], []
+        price_delta = 0
+        for product_id, price in prices.items():
+            qty = items[str(product_id)]
+            cart_product = existing.get(product_id)
+            if cart_product:
+                old_price = cart_product.final_price
+                cart_product.qty += qty
+                cart_product.final_price = cart_product.qty * price
+                price_delta += cart_product.final_price - old_price
+                updated.append(cart_product)
+            else:
+                created.append(CartProduct(
+                    user_id=cart.owner_id, cart=cart, product_id=product_id,
+                    qty=qty, final_price=qty * price
+                    ))
+                price_delta += qty * price
+        if updated:
+            CartProduct.objects.bulk_update(updated, ['qty', 'final_price'])
+        if created:
+            CartProduct.objects.bulk_create(created)
+        apply_cart_delta(cart, len(created), price_delta)
+    # Dropped only once merged, so a failed merge keeps the visitor's items.
+    request.session.pop(ANONYMOUS_CART_SESSION_KEY, None)
+    remember_cart(request, cart)
+
+
+def lock_cart(cart):
+    totals = Cart.objects.select_for_update().filter(
+        pk=cart.pk, in_order=False
+        ).values_list('total_products', 'final_price').first()
+    if totals is None:
+        return False
+    cart.total_products, cart.final_price = totals
+    return True
+
+
+def apply_cart_delta(cart, products_delta, price_delta):
+    Cart.objects.filter(pk=cart.pk, in_order=False).update(
+        total_products=F('total_products') + products_delta,
+        final_price=F('final_price') + price_delta
+        )
+    cart.total_products += products_delta
+    cart.final_price += price_delta
+
+
+def get_cart_line(cart, product):
+    return CartProduct.objects.filter(
+        cart=cart, product=product
+        ).values_list('id', 'final_price').first()
+
+
+def add_to_cart(cart, product):
+    cart = unwrap_cart(cart)
+    if isinstance(cart, SessionCart):
+        cart.add(product)
+        return
+    with transaction.atomic():
+        if not lock_cart(cart) or get_cart_line(cart, product):
+            return
+        cart_product = CartProduct.objects.create(
+            user_id=cart.owner_id, cart=cart, product=product,
+            final_price=product.price
+            )
+        apply_cart_delta(cart, 1, cart_product.final_price)
+
+
+def change_qty(cart, product, qty):
+    if qty <= 0:
+        remove_from_cart(cart, product)
+        return
+    cart = unwrap_cart(cart)
+    if isinstance(cart, SessionCart):
+        cart.set_qty(product, qty)
+        return
+    with transaction.atomic():
+        line = lock_cart(cart) and get_cart_line(cart, product)
+        if not line:
+            return
+        line_id, old_price = line
+        final_price = qty * product.price
+        CartProduct.objects.filter(pk=line_id).update(
+            qty=qty, final_price=final_price
+            )
+        apply_cart_delta(cart, 0, final_price - old_price)
+
+
+def remove_from_cart(cart, product):
+    cart = unwrap_cart(cart)
+    if isinstance(cart, SessionCart):
+        cart.remove(product)
+        return
+    with transaction.atomic():
+        line = lock_cart(cart) and get_cart_line(cart, product)
+        if not line:
+            return
+        line_id, old_price = line
+        CartProduct.objects.filter(pk=line_id).delete()
+        apply_cart_delta(cart, -1, -old_price)
+
+
+def get_cart_lines(cart):
+    cart = unwrap_cart(cart)
+    if isinstance(cart, SessionCart):
+        return cart.products.all()
+    return cart.related_products.select_related('product')
+
+
+def add_qty(qtys, key, operation):
+    # An add with qty increases the quantity; without it the product is
+    # only put in the cart once, like add_to_cart.
+    if 'qty' in operation:
+        qtys[key] = qtys.get(key, 0) + operation['qty']
+    else:
+        qtys.setdefault(key, 1)
+
+
+def apply_cart_operations(cart, operations, products):
+    """Apply operations in order; return False if the cart is ordered."""
+    cart = unwrap_cart(cart)
+    if isinstance(cart, SessionCart):
+        items = cart.items
+        for operation in operations:
+            key = str(products[operation['slug']].id)
+            if operation['op'] == CART_OP_ADD:
+                add_qty(items, key, operation)
+            elif operation['op'] == CART_OP_SET_QTY:
+                items[key] = operation['qty']
+            else:
+                items.pop(key, None)
+        cart.save_items(items)
+        return True
+    with transaction.atomic():
+        if not lock_cart(cart):
+            return False
+        lines = {
+            line.product_id: line for line in
+            cart.related_products.filter(product__in=products.values())
+        }
+        qtys = {product_id: line.qty for product_id, line in lines.items()}
+        for operation in operations:
+            product_id = products[operation['slug']].id
+            if operation['op'] == CART_OP_ADD:
+                add_qty(qtys, product_id, operation)
+            elif operation['op'] == CART_OP_SET_QTY:
+                qtys[product_id] = operation['qty']
+            else:
+                qtys.pop(product_id, None)
+        prices = {product.id: product.price for product in products.values()}
+        created = [
+            CartProduct(
+                user_id=cart.owner_id, cart=cart, product_id=product_id,
+                qty=qty, final_price=qty * prices[product_id]
+                )
+            for product_id, qty in qtys.items() if product_id not in lines
+        ]
+        updated = []
+        for product_id, line in lines.items():
+            if product_id in qtys and qtys[product_id] != line.qty:
+                line.qty = qtys[product_id]
+                line.final_price = line.qty * prices[product_id]
+                updated.append(line)
+        deleted = [
+            line.id for product_id, line in lines.items()
+            if product_id not in qtys
+        ]
+        if deleted:
+            CartProduct.objects.filter(pk__in=deleted).delete()
+        if updated:
+            CartProduct.objects.bulk_update(updated, ['qty', 'final_price'])
+        if created:
+            CartProduct.objects.bulk_create(created)
+        recalc_cart(cart)
+    return True
@@ -0,0 +1,195 @@
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.core.cache import caches
+
+CATALOG_VERSION_KEY = 'catalog:version'
+CATALOG_RESET_KEY = 'catalog:reset'
+
+
+def new_version():
+    return str(time.time_ns())
+
+
+class LRUCache:
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key not in self._data:
+                return default
+            self._data.move_to_end(key)
+            return self._data[key]
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+# Entries are keyed by a catalog version kept in the shared cache: the
+# nanosecond timestamp of the last catalog change. Bumping it invalidates
+# the local LRU of every worker; each one rereads the version at most once
+# per ``version_check_interval`` seconds.
+#
+# Entries cached with a ``scope`` (such as one category) are keyed by that
+# scope's own version instead, so invalidating one scope keeps the others.
+# A full invalidation resets every scope.
+class CatalogCache:
+
+    _missing = object()
+
+    def __init__(self, alias='default', maxsize=256, timeout=300,
+                 version_check_interval=1):
+        self.alias = alias
+        self.timeout = timeout
+        self.version_check_interval = version_check_interval
+        self.local = LRUCache(maxsize)
+        self.scoped = LRUCache(maxsize)
+        self._version = None
+        self._version_checked_at = 0
+        self._scope_versions = {}
+        self.local_hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+
+    @property
+    def shared(self):
+        return caches[self.alias]
+
+    def get_version(self):
+        now = time.monotonic()
+        if (self._version is None or
+                now - self._version_checked_at >= self.version_check_interval):
+            version = self.shared.get(CATALOG_VERSION_KEY)
+            if version is None:
+                version = new_version()
+                if not self.shared.add(CATALOG_VERSION_KEY, version, None):
+                    version = self.shared.get(CATALOG_VERSION_KEY, version)
+            if not str(version).isdigit():
+                # Left over from the uuid-based versions; treat it as stale.
+                version = new_version()
+                self.shared.set(CATALOG_VERSION_KEY, version, None)
+            if version != self._version:
+                self.local.clear()
+                self._version = version
+            self._version_checked_at = now
+        return self._version
+
+    def get_scope_version(self, scope):
+        now = time.monotonic()
+        version, checked_at = self._scope_versions.get(scope, (None, 0))
+        if version is None or now - checked_at >= self.version_check_interval:
+            keys = (CATALOG_RESET_KEY, f'catalog:scope:{scope}')
+            found = self.shared.get_many(keys)
+            parts = []
+            for key in keys:
+                part = found.get(key)
+                if part is None:
+                    part = new_version()
+                    if not self.shared.add(key, part, None):
+                        part = self.shared.get(key, part)
+                parts.append(part)
+            version = '-'.join(parts)
+            self._scope_versions[scope] = (version, now)
+        return version
+
+    def last_modified(self):
+        return datetime.fromtimestamp(
+            int(self.get_version()) / 10 ** 9, tz=timezone.utc
+            )
+
+    def get_or_set(self, key, default, scope=None):
+        if scope is not None:
+            return self.get_or_set_scoped(scope, key, default)
+        version = self.get_version()
+        value = self.local.get(key, self._missing)
+        if value is not self._missing:
+            self.local_hits += 1
+            return value
+        shared_key = f'catalog:{version}:{key}'
+        value = self.shared.get(shared_key, self._missing)
+        if value is not self._missing:
+            self.shared_hits += 1
+        else:
+            self.misses += 1
+            value = default()
+            self.shared.set(shared_key, value, self.timeout)
+        self.local.set(key, value)
+        return value
+
+    def get_or_set_scoped(self, scope, key, default):
+        version = self.get_scope_version(scope)
+        cached_version, value = self.scoped.get(
+            (scope, key), (None, self._missing)
+            )
+        if cached_version == version:
+            self.local_hits += 1
+            return value
+        shared_key = f'catalog:{scope}:{version}:{key}'
+        value = self.shared.get(shared_key, self._missing)
+        if value is not self._missing:
+            self.shared_hits += 1
+        else:
+            self.misses += 1
+            value = default()
+            self.shared.set(shared_key, value, self.timeout)
+        self.scoped.set((scope, key), (version, value))
+        return value
+
+    def invalidate(self, scopes=None):
+        """Invalidate the catalog, keeping scoped entries outside ``scopes``.
+
+        Without ``scopes`` every scoped entry is invalidated too.
+        """
+        versions = {CATALOG_VERSION_KEY: new_version()}
+        if scopes is None:
+            versions[CATALOG_RESET_KEY] = new_version()
+            self.scoped.clear()
+            self._scope_versions.clear()
+        else:
+            for scope in scopes:
+                versions[f'catalog:scope:{scope}'] = new_version()
+                self._scope_versions.pop(scope, None)
+        self.shared.set_many(versions, None)
+        self.local.clear()
+        self._version = None
+
+    def stats(self):
+        total = self.local_hits + self.shared_hits + self.misses
+        return {
+            'version': self._version,
+            'local_size': len(self.local),
+            'local_hits': self.local_hits,
+            'shared_hits': self.shared_hits,
+            'misses': self.misses,
+            'hit_rate': (
+                (self.local_hits + self.shared_hits) / total if total else 0
+                ),
+        }
+
+
+catalog_cache = CatalogCache(**getattr(settings, 'CATALOG_CACHE', {}))
+
+
+def get_categories():
+    from .models import Category
+    return catalog_cache.get_or_set(
+        'categories', lambda: list(Category.objects.all())
+        )
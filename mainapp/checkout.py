@@ -0,0 +1,80 @@
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+
+from .cart import SessionCart, unwrap_cart
+from .models import Cart, CartProduct, Order, OrderProduct
+from .outbox import publish
+from .rollups import record_order
+from .utils import summarize_order_lines
+
+ORDER_FIELDS = (
+    'first_name', 'last_name', 'phone', 'address', 'buying_type',
+    'order_date', 'comment'
+)
+
+
+class CheckoutError(Exception):
+    pass
+
+
+def place_order(cart, order_data, idempotency_key=None):
+    cart = unwrap_cart(cart)
+    if isinstance(cart, SessionCart):
+        raise CheckoutError('Войдите, чтобы оформить заказ')
+    try:
+        return create_order(cart, order_data, idempotency_key)
+    except IntegrityError:
+        if not idempotency_key:
+            raise
+        order = Order.objects.get(
+            customer_id=cart.owner_id, idempotency_key=idempotency_key
+            )
+        return order, False
+
+
+def create_order(cart, order_data, idempotency_key):
+    customer_id = cart.owner_id
+    with transaction.atomic():
+        in_order = Cart.objects.select_for_update().filter(
+            pk=cart.pk
+            ).values_list('in_order', flat=True).first()
+        if idempotency_key:
+            order = Order.objects.filter(
+                customer_id=customer_id, idempotency_key=idempotency_key
+                ).first()
+            if order is not None:
+                return order, False
+        if in_order is None or in_order:
+            raise CheckoutError('Корзина уже оформлена')
+        lines = [
+            line for line in CartProduct.objects.filter(cart=cart).values_list(
+                'product_id', 'product__title', 'product__image',
+                'product__image_hash', 'qty', 'final_price'
+            ).order_by('id') if line[4]
+        ]
+        if not lines:
+            raise CheckoutError('Корзина пуста')
+        order = Order.objects.create(
+            customer_id=customer_id,
+            cart_id=cart.pk,
+            idempotency_key=idempotency_key or None,
+            **summarize_order_lines(line[1:] for line in lines),
+            **{field: order_data.get(field) for field in ORDER_FIELDS}
+        )
+        OrderProduct.objects.bulk_create([
+            OrderProduct(
+                order=order,
+                product_id=product_id,
+                title=title,
+                price=(final_price / qty).quantize(Decimal('0.01')),
+                qty=qty,
+                final_price=final_price
+            )
+            for product_id, title, image, image_hash, qty, final_price in lines
+        ])
+        Cart.objects.filter(pk=cart.pk).update(in_order=True)
+        record_order(order)
+        publish('order.placed', {'order_id': order.id})
+    cart.in_order = True
+    return order, True
@@ -0,0 +1,101 @@
+import os
+import threading
+
+import psycopg2
+import psycopg2.extras
+from django.db.backends.postgresql.base import \
+    DatabaseWrapper as PostgresDatabaseWrapper
+from psycopg2 import OperationalError
+from psycopg2.extensions import (TRANSACTION_STATUS_IDLE,
+                                 TRANSACTION_STATUS_UNKNOWN)
+
+from mainapp.db.pool import ConnectionPool, PoolTimeout, pools
+
+from .creation import DatabaseCreation
+
+POOL_DEFAULTS = {
+    'MAX_SIZE': 10,
+    'MIN_SIZE': 0,
+    'TIMEOUT': 5.0,
+    'MAX_LIFETIME': 1800.0,
+    'MAX_IDLE': 300.0,
+    'CHECK_AFTER': 30.0,
+}
+
+pools_lock = threading.Lock()
+
+
+def connect(conn_params, isolation_level):
+    connection = psycopg2.connect(**conn_params)
+    if isolation_level is not None and \
+            isolation_level != connection.isolation_level:
+        connection.set_session(isolation_level=isolation_level)
+    psycopg2.extras.register_default_jsonb(
+        conn_or_curs=connection, loads=lambda x: x
+        )
+    return connection
+
+
+def reset_connection(connection):
+    status = connection.info.transaction_status
+    if status == TRANSACTION_STATUS_UNKNOWN:
+        raise OperationalError('connection is broken')
+    if status != TRANSACTION_STATUS_IDLE:
+        connection.rollback()
+
+
+def check_connection(connection):
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT 1')
+    reset_connection(connection)
+
+
+class DatabaseWrapper(PostgresDatabaseWrapper):
+
+    creation_class = DatabaseCreation
+
+    @property
+    def pool(self):
+        key = (self.alias, os.getpid(), self.settings_dict['NAME'])
+        pool = pools.get(key)
+        if pool is None:
+            with pools_lock:
+                pool = pools.get(key)
+                if pool is None:
+                    options = {
+                        **POOL_DEFAULTS, **self.settings_dict.get('POOL', {})
+                    }
+                    conn_params = self.get_connection_params()
+                    isolation_level = self.settings_dict['OPTIONS'].get(
+                        'isolation_level'
+                        )
+                    pool = pools[key] = ConnectionPool(
+                        lambda: connect(conn_params, isolation_level),
+                        reset_connection,
+                        check_connection,
+                        max_size=options['MAX_SIZE'],
+                        min_size=options['MIN_SIZE'],
+                        timeout=options['TIMEOUT'],
+                        max_lifetime=options['MAX_LIFETIME'],
+                        max_idle=options['MAX_IDLE'],
+                        check_after=options['CHECK_AFTER'],
+                    )
+        return pool
+
+    def get_new_connection(self, conn_params):
+        try:
+            connection = self.pool.getconn()
+        except PoolTimeout as e:
+            raise OperationalError(str(e))
+        options = self.settings_dict['OPTIONS']
+        self.isolation_level = options.get(
+            'isolation_level', connection.isolation_level
+            )
+        return connection
+
+    def _close(self):
+        if self.connection is not None:
+            with self.wrap_database_errors:
+                self.pool.putconn(
+                    self.connection, close=self.in_atomic_block
+                    )
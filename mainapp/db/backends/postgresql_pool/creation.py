@@ -0,0 +1,17 @@
+from django.db.backends.postgresql.creation import \
+    DatabaseCreation as PostgresDatabaseCreation
+
+from mainapp.db.pool import close_pools
+
+
+class DatabaseCreation(PostgresDatabaseCreation):
+    # Idle pooled connections to the test database would make PostgreSQL
+    # refuse to drop it or to use it as a template for parallel clones.
+
+    def _clone_test_db(self, suffix, verbosity, keepdb=False):
+        close_pools(self.connection.settings_dict['NAME'])
+        super()._clone_test_db(suffix, verbosity, keepdb)
+
+    def _destroy_test_db(self, test_database_name, verbosity):
+        close_pools(test_database_name)
+        super()._destroy_test_db(test_database_name, verbosity)
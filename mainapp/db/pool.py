@@ -0,0 +1,226 @@
+import atexit
+import os
+import threading
+import time
+from collections import deque
+
+pools = {}
+
+
+def get_pool_stats():
+    pid = os.getpid()
+    return {
+        alias: pool.stats()
+        for (alias, pool_pid, _), pool in list(pools.items())
+        if pool_pid == pid
+    }
+
+
+def close_pools(name=None):
+    """Close this process's pools, or only those connected to ``name``."""
+    pid = os.getpid()
+    for key, pool in list(pools.items()):
+        _, pool_pid, pool_name = key
+        if pool_pid == pid and name in (None, pool_name):
+            del pools[key]
+            pool.close()
+
+
+atexit.register(close_pools)
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+class PooledConnection:
+
+    __slots__ = ('connection', 'created_at', 'returned_at')
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.created_at = self.returned_at = time.monotonic()
+
+
+class Waiter:
+
+    __slots__ = ('event', 'pooled', 'granted')
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.pooled = None
+        self.granted = False
+
+
+class ConnectionPool:
+
+    def __init__(self, connect, reset, check, max_size=10, min_size=0,
+                 timeout=5.0, max_lifetime=1800.0, max_idle=300.0,
+                 check_after=30.0):
+        self.connect = connect
+        self.reset = reset
+        self.check = check
+        self.max_size = max_size
+        self.min_size = min_size
+        self.timeout = timeout
+        self.max_lifetime = max_lifetime
+        self.max_idle = max_idle
+        self.check_after = check_after
+        self.idle = deque()
+        self.waiters = deque()
+        self.in_use = {}
+        self.size = 0
+        self.closed = False
+        self.lock = threading.Lock()
+        self.counters = dict.fromkeys((
+            'checkouts', 'waits', 'timeouts', 'created', 'recycled',
+            'failed_checks'
+        ), 0)
+        self.wait_time_total = 0.0
+        self.wait_time_max = 0.0
+
+    def expired(self, pooled, now):
+        return (
+            now - pooled.created_at > self.max_lifetime or
+            now - pooled.returned_at > self.max_idle and
+            self.size > self.min_size
+        )
+
+    def hand_over(self, pooled):
+        # Called with the lock held: a returned connection (or, for None,
+        # a free slot) goes to the longest waiting thread first.
+        if self.waiters:
+            waiter = self.waiters.popleft()
+            waiter.pooled = pooled
+            waiter.granted = True
+            if pooled is None:
+                self.size += 1
+            waiter.event.set()
+        elif pooled is not None:
+            self.idle.append(pooled)
+
+    def discard(self, pooled):
+        self.size -= 1
+        self.hand_over(None)
+        try:
+            pooled.connection.close()
+        except Exception:
+            pass
+
+    def take_idle(self):
+        now = time.monotonic()
+        while self.idle:
+            pooled = self.idle.pop()
+            if self.expired(pooled, now):
+                self.counters['recycled'] += 1
+                self.size -= 1
+                try:
+                    pooled.connection.close()
+                except Exception:
+                    pass
+                continue
+            return pooled
+        return None
+
+    def acquire(self):
+        started = time.monotonic()
+        with self.lock:
+            self.counters['checkouts'] += 1
+            if not self.waiters:
+                pooled = self.take_idle()
+                if pooled is not None:
+                    return pooled
+                if self.size < self.max_size:
+                    self.size += 1
+                    return None
+            waiter = Waiter()
+            self.waiters.append(waiter)
+        waiter.event.wait(self.timeout)
+        with self.lock:
+            wait_time = time.monotonic() - started
+            self.counters['waits'] += 1
+            self.wait_time_total += wait_time
+            self.wait_time_max = max(self.wait_time_max, wait_time)
+            if not waiter.granted:
+                self.waiters.remove(waiter)
+                self.counters['timeouts'] += 1
+                raise PoolTimeout(
+                    f'no free connection in {self.timeout:.1f}s '
+                    f'(max_size={self.max_size})'
+                )
+        return waiter.pooled
+
+    def getconn(self):
+        pooled = self.acquire()
+        if pooled is not None and \
+                time.monotonic() - pooled.returned_at > self.check_after:
+            try:
+                self.check(pooled.connection)
+            except Exception:
+                try:
+                    pooled.connection.close()
+                except Exception:
+                    pass
+                with self.lock:
+                    self.counters['failed_checks'] += 1
+                pooled = None
+        if pooled is None:
+            try:
+                pooled = PooledConnection(self.connect())
+            except Exception:
+                with self.lock:
+                    self.size -= 1
+                    self.hand_over(None)
+                raise
+            with self.lock:
+                self.counters['created'] += 1
+        with self.lock:
+            self.in_use[id(pooled.connection)] = pooled
+        return pooled.connection
+
+    def putconn(self, connection, close=False):
+        with self.lock:
+            pooled = self.in_use.pop(id(connection), None)
+        if pooled is None:
+            connection.close()
+            return
+        try:
+            if close or self.closed:
+                raise ConnectionAbortedError
+            self.reset(connection)
+        except Exception:
+            with self.lock:
+                self.discard(pooled)
+            return
+        pooled.returned_at = time.monotonic()
+        with self.lock:
+            if self.expired(pooled, pooled.returned_at):
+                self.counters['recycled'] += 1
+                self.discard(pooled)
+            else:
+                self.hand_over(pooled)
+
+    def close(self):
+        # Connections still in use are closed when they are returned.
+        with self.lock:
+            self.closed = True
+            while self.idle:
+                pooled = self.idle.pop()
+                self.size -= 1
+                try:
+                    pooled.connection.close()
+                except Exception:
+                    pass
+
+    def stats(self):
+        with self.lock:
+            return {
+                'size': self.size,
+                'max_size': self.max_size,
+                'in_use': len(self.in_use),
+                'idle': len(self.idle),
+                'waiting': len(self.waiters),
+                **self.counters,
+                'wait_time_total': round(self.wait_time_total, 6),
+                'wait_time_max': round(self.wait_time_max, 6),
+            }
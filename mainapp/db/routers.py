@@ -0,0 +1,95 @@
+import asyncio
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.utils.decorators import sync_and_async_middleware
+
+REPLICA_MODELS = {
+    'mainapp.category', 'mainapp.product', 'mainapp.productfeatures',
+    'mainapp.productfeaturevalues', 'mainapp.order', 'mainapp.orderproduct',
+}
+STICKY_MODELS = {
+    'mainapp.cart', 'mainapp.cartproduct', 'mainapp.order',
+    'mainapp.orderproduct', 'mainapp.customer', 'auth.user',
+}
+PRIMARY_COOKIE = 'primary_until'
+
+pinned_to_primary = ContextVar('pinned_to_primary', default=False)
+wrote_to_primary = ContextVar('wrote_to_primary', default=False)
+
+
+def get_replica():
+    replicas = settings.DATABASE_REPLICAS
+    if not replicas:
+        return DEFAULT_DB_ALIAS
+    return random.choice(replicas)
+
+
+@contextmanager
+def use_primary():
+    token = pinned_to_primary.set(True)
+    try:
+        yield
+    finally:
+        pinned_to_primary.reset(token)
+
+
+class PrimaryReplicaRouter:
+
+    def db_for_read(self, model, **hints):
+        if model._meta.label_lower not in REPLICA_MODELS or \
+                pinned_to_primary.get() or wrote_to_primary.get() or \
+                connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return get_replica()
+
+    def db_for_write(self, model, **hints):
+        if model._meta.label_lower in STICKY_MODELS:
+            wrote_to_primary.set(True)
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
+
+
+def start_request(request):
+    try:
+        pinned = float(request.COOKIES.get(PRIMARY_COOKIE, 0)) > time.time()
+    except ValueError:
+        pinned = False
+    return pinned_to_primary.set(pinned), wrote_to_primary.set(False)
+
+
+def finish_request(response, tokens):
+    if wrote_to_primary.get():
+        response.set_cookie(
+            PRIMARY_COOKIE,
+            str(time.time() + settings.PRIMARY_STICKY_SECONDS),
+            max_age=settings.PRIMARY_STICKY_SECONDS, httponly=True,
+            samesite='Lax'
+            )
+    pinned_to_primary.reset(tokens[0])
+    wrote_to_primary.reset(tokens[1])
+    return response
+
+
+@sync_and_async_middleware
+def primary_stickiness_middleware(get_response):
+    # Return a coroutine function when the chain below is async so Django
+    # doesn't wrap it in a thread.
+    if asyncio.iscoroutinefunction(get_response):
+        async def middleware(request):
+            tokens = start_request(request)
+            return finish_request(await get_response(request), tokens)
+    else:
+        def middleware(request):
+            tokens = start_request(request)
+            return finish_request(get_response(request), tokens)
+    return middleware
@@ -0,0 +1,80 @@
+from django.db.models import Count, Sum
+
+
+def find_duplicate_lines(CartProduct):
+    return CartProduct.objects.values('cart_id', 'product_id').annotate(
+        n=Count('id')
+        ).filter(n__gt=1).order_by()
+
+
+def find_duplicate_open_carts(Cart):
+    return Cart.objects.filter(
+        in_order=False, owner__isnull=False
+        ).values('owner_id').annotate(n=Count('id')).filter(n__gt=1).order_by()
+
+
+def recalc_totals(Cart, CartProduct, cart_id):
+    totals = CartProduct.objects.filter(cart_id=cart_id).aggregate(
+        final_price=Sum('final_price'), total_products=Count('id')
+        )
+    Cart.objects.filter(pk=cart_id).update(
+        final_price=totals['final_price'] or 0,
+        total_products=totals['total_products']
+        )
+
+
+def merge_duplicate_lines(Cart, CartProduct):
+    merged = 0
+    for row in list(find_duplicate_lines(CartProduct)):
+        lines = list(CartProduct.objects.filter(
+            cart_id=row['cart_id'], product_id=row['product_id']
+            ).order_by('id'))
+        keep, extra = lines[0], lines[1:]
+        CartProduct.objects.filter(pk=keep.pk).update(
+            qty=sum(line.qty for line in lines),
+            final_price=sum(line.final_price for line in lines)
+            )
+        CartProduct.objects.filter(pk__in=[line.pk for line in extra]).delete()
+        recalc_totals(Cart, CartProduct, keep.cart_id)
+        merged += len(extra)
+    return merged
+
+
+def merge_duplicate_open_carts(Cart, CartProduct, Order):
+    merged = 0
+    for row in list(find_duplicate_open_carts(Cart)):
+        carts = list(Cart.objects.filter(
+            owner_id=row['owner_id'], in_order=False
+            ).order_by('-id').values_list('id', flat=True))
+        keep, extra = carts[0], carts[1:]
+        existing = {
+            line.product_id: line
+            for line in CartProduct.objects.filter(cart_id=keep)
+        }
+        grown, moved = [], []
+        for line in CartProduct.objects.filter(cart_id__in=extra):
+            target = existing.get(line.product_id)
+            if target is None:
+                line.cart_id = keep
+                existing[line.product_id] = line
+                moved.append(line)
+            else:
+                target.qty += line.qty
+                target.final_price += line.final_price
+                grown.append(target)
+        CartProduct.objects.bulk_update(grown, ['qty', 'final_price'])
+        CartProduct.objects.bulk_update(moved, ['cart'])
+        ordered = set(Order.objects.filter(cart_id__in=extra).values_list(
+            'cart_id', flat=True
+            ))
+        Cart.objects.filter(id__in=ordered).update(in_order=True)
+        Cart.objects.filter(id__in=set(extra) - ordered).delete()
+        recalc_totals(Cart, CartProduct, keep)
+        merged += len(extra)
+    return merged
+
+
+def dedupe_carts(Cart, CartProduct, Order):
+    lines = merge_duplicate_lines(Cart, CartProduct)
+    carts = merge_duplicate_open_carts(Cart, CartProduct, Order)
+    return lines, carts
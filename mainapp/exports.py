@@ -0,0 +1,96 @@
+import csv
+import json
+from datetime import datetime, time, timedelta
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+
+from .models import Order
+from .utils import chunked
+
+ORDER_EXPORT_COLUMNS = (
+    ('id', 'id'),
+    ('created_at', 'created_at'),
+    ('order_date', 'order_date'),
+    ('status', 'status'),
+    ('buying_type', 'buying_type'),
+    ('customer_id', 'customer_id'),
+    ('username', 'customer__user__username'),
+    ('first_name', 'first_name'),
+    ('last_name', 'last_name'),
+    ('phone', 'phone'),
+    ('address', 'address'),
+    ('total_products', 'cart__total_products'),
+    ('final_price', 'cart__final_price'),
+)
+ORDER_EXPORT_HEADERS = [name for name, _ in ORDER_EXPORT_COLUMNS]
+ORDER_EXPORT_DATE_FIELDS = ('created_at', 'order_date')
+EXPORT_FORMATS = ('csv', 'ndjson', 'arrow')
+
+
+def get_order_rows(date_field='created_at', date_from=None, date_to=None,
+                   chunk_size=5000):
+    queryset = Order.objects.all()
+    if date_field == 'created_at':
+        if date_from:
+            queryset = queryset.filter(created_at__gte=timezone.make_aware(
+                datetime.combine(date_from, time.min)
+                ))
+        if date_to:
+            queryset = queryset.filter(created_at__lt=timezone.make_aware(
+                datetime.combine(date_to + timedelta(days=1), time.min)
+                ))
+    else:
+        if date_from:
+            queryset = queryset.filter(order_date__gte=date_from)
+        if date_to:
+            queryset = queryset.filter(order_date__lte=date_to)
+    return queryset.order_by('id').values_list(
+        *[lookup for _, lookup in ORDER_EXPORT_COLUMNS]
+        ).iterator(chunk_size=chunk_size)
+
+
+class Echo:
+
+    def write(self, value):
+        return value
+
+
+def iter_csv(rows):
+    writer = csv.writer(Echo())
+    yield writer.writerow(ORDER_EXPORT_HEADERS)
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def iter_ndjson(rows):
+    for row in rows:
+        yield json.dumps(
+            dict(zip(ORDER_EXPORT_HEADERS, row)), cls=DjangoJSONEncoder,
+            ensure_ascii=False
+            ) + '\n'
+
+
+def write_arrow(rows, path, batch_size=65536):
+    try:
+        import pyarrow as pa
+    except ImportError:
+        raise ImportError(
+            'Для выгрузки в формате Arrow установите пакет pyarrow'
+            )
+    writer = None
+    written = 0
+    try:
+        for chunk in chunked(rows, batch_size):
+            batch = pa.RecordBatch.from_arrays(
+                [pa.array(column) for column in zip(*chunk)],
+                names=ORDER_EXPORT_HEADERS
+                )
+            if writer is None:
+                writer = pa.ipc.new_file(path, batch.schema)
+            writer.write_batch(batch)
+            written += len(chunk)
+    finally:
+        if writer is not None:
+            writer.close()
+    return written
@@ -0,0 +1,181 @@
+from bisect import bisect_left, bisect_right
+from decimal import Decimal, InvalidOperation
+
+from .catalog_cache import catalog_cache
+from .models import Product, ProductFeatures, ProductFeatureValues
+from .pagination import KeysetPage, KeysetPaginator
+
+
+class FacetIndex:
+
+    def __init__(self, prices, postings):
+        self.prices = prices
+        self.postings = {
+            feature_key: dict(sorted(feature_postings.items()))
+            for feature_key, feature_postings in postings.items()
+        }
+        self.all_ids = frozenset(prices)
+        by_price = sorted(prices, key=lambda pk: (prices[pk], pk))
+        self.price_ids = by_price
+        self.price_keys = [prices[pk] for pk in by_price]
+        self.orderings = {}
+        for sort, ordering in Product.ORDERINGS.items():
+            ids = sorted(prices, key=lambda pk: self.sort_key(ordering, pk))
+            keys = [self.sort_key(ordering, pk) for pk in ids]
+            self.orderings[sort] = (ids, keys)
+
+    @classmethod
+    def build(cls, category):
+        prices = dict(
+            Product.objects.filter(category=category).values_list('id', 'price')
+            )
+        postings = {}
+        values = ProductFeatureValues.objects.filter(
+            product__category=category, feature__use_in_filter=True
+            ).values_list('feature__feature_key', 'value', 'product_id')
+        for feature_key, value, product_id in values.iterator():
+            postings.setdefault(feature_key, {}).setdefault(
+                value, set()).add(product_id)
+        for feature_postings in postings.values():
+            for value, ids in feature_postings.items():
+                feature_postings[value] = frozenset(ids)
+        return cls(prices, postings)
+
+    @classmethod
+    def for_category(cls, category):
+        return catalog_cache.get_or_set(
+            'facet_index', lambda: cls.build(category),
+            scope=f'category:{category.id}'
+            )
+
+    def sort_key(self, ordering, pk):
+        key = []
+        for name in ordering:
+            value = self.prices[pk] if name.lstrip('-') == 'price' else pk
+            key.append(-value if name.startswith('-') else value)
+        return tuple(key)
+
+    def match_price(self, price_min=None, price_max=None):
+        if price_min is None and price_max is None:
+            return self.all_ids
+        start = 0 if price_min is None else \
+            bisect_left(self.price_keys, price_min)
+        end = len(self.price_keys) if price_max is None else \
+            bisect_right(self.price_keys, price_max)
+        return frozenset(self.price_ids[start:end])
+
+    def match_filters(self, filters):
+        matched = {}
+        for feature_key, values in filters.items():
+            if not values:
+                continue
+            feature_postings = self.postings.get(feature_key, {})
+            ids = set()
+            for value in values:
+                ids |= feature_postings.get(value, frozenset())
+            matched[feature_key] = ids
+        return matched
+
+    def match(self, filters, price_min=None, price_max=None):
+        ids = self.match_price(price_min, price_max)
+        for matched in self.match_filters(filters).values():
+            ids = ids & matched
+        return ids
+
+    def facet_counts(self, filters, price_min=None, price_max=None):
+        # Features without a selected value all count against the same
+        # match, so only the filtered features need a match of their own.
+        price_ids = self.match_price(price_min, price_max)
+        matched = self.match_filters(filters)
+        matched_ids = price_ids
+        for ids in matched.values():
+            matched_ids = matched_ids & ids
+        counts = {}
+        for feature_key, feature_postings in self.postings.items():
+            ids = matched_ids
+            if feature_key in matched:
+                ids = price_ids
+                for other_key, other_ids in matched.items():
+                    if other_key != feature_key:
+                        ids = ids & other_ids
+            if ids is self.all_ids:
+                counts[feature_key] = {
+                    value: len(postings)
+                    for value, postings in feature_postings.items()
+                }
+            else:
+                counts[feature_key] = {
+                    value: len(ids & postings)
+                    for value, postings in feature_postings.items()
+                }
+        return counts
+
+    def get_page(self, ids, sort, cursor, per_page):
+        ordering = Product.ORDERINGS[sort]
+        paginator = KeysetPaginator(None, ordering, per_page)
+        ordered_ids, keys = self.orderings[sort]
+        start = 0
+        values = paginator.decode_cursor(cursor) if cursor else None
+        if values:
+            try:
+                key = []
+                for name, value in zip(ordering, values):
+                    value = Decimal(value) if name.lstrip('-') == 'price' \
+                        else int(value)
+                    key.append(-value if name.startswith('-') else value)
+                start = bisect_right(keys, tuple(key))
+            except (InvalidOperation, ValueError):
+                pass
+        page_ids = []
+        for pk in ordered_ids[start:]:
+            if pk in ids:
+                page_ids.append(pk)
+                if len(page_ids) > per_page:
+                    break
+        products = Product.objects.only(*Product.CARD_FIELDS).in_bulk(
+            page_ids[:per_page]
+            )
+        object_list = [
+            products[pk] for pk in page_ids[:per_page] if pk in products
+        ]
+        next_cursor = None
+        if len(page_ids) > per_page and object_list:
+            next_cursor = paginator.encode_cursor(object_list[-1])
+        return KeysetPage(object_list, next_cursor)
+
+
+def parse_price(value):
+    try:
+        price = Decimal(value) if value else None
+    except InvalidOperation:
+        return None
+    if price is not None and not price.is_finite():
+        return None
+    return price
+
+
+def parse_filters(category, query):
+    filters = {}
+    for field in category.get_fields_for_filter_in_template():
+        values = query.getlist(field['feature_key'])
+        if field['filter_type'] == ProductFeatures.RADIO:
+            values = values[-1:]
+        if values:
+            filters[field['feature_key']] = set(values)
+    return (
+        filters,
+        parse_price(query.get('price_min')),
+        parse_price(query.get('price_max'))
+        )
+
+
+def get_facets(category, index, filters, price_min=None, price_max=None):
+    counts = index.facet_counts(filters, price_min, price_max)
+    facets = []
+    for field in category.get_fields_for_filter_in_template():
+        selected = filters.get(field['feature_key'], set())
+        facets.append(dict(field, values=[
+            {'value': value, 'count': count, 'selected': value in selected}
+            for value, count in counts.get(field['feature_key'], {}).items()
+        ]))
+    return facets
@@ -11,6 +11,9 @@ class OrderForm(forms.ModelForm):
         self.fields['order_date'].label = 'Дата получения заказа'
 
     order_date = forms.DateField(widget=forms.TextInput(attrs={'type': 'date'}))
+    idempotency_key = forms.CharField(
+        widget=forms.HiddenInput, required=False, max_length=64
+        )
 
     class Meta:
         model = Order
@@ -0,0 +1,16 @@
+from django.core.mail import mail_managers
+
+from .models import Order
+from .outbox import handler
+
+
+@handler('order.placed')
+def notify_managers(payload):
+    order = Order.objects.get(pk=payload['order_id'])
+    mail_managers(
+        f'Новый заказ №{order.id}',
+        f'{order.first_name} {order.last_name}, {order.phone}\n'
+        f'Сумма: {order.final_price} руб.\n'
+        f'Дата получения: {order.order_date}',
+        fail_silently=False
+    )
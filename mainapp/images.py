@@ -0,0 +1,101 @@
+import hashlib
+import re
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image
+
+PRESETS = {
+    'card': (400, 300),
+    'cart': (160, 160),
+    'detail': (800, 800),
+}
+DENSITIES = (1, 2)
+FORMATS = {
+    'webp': ('WEBP', 'image/webp'),
+    'jpeg': ('JPEG', 'image/jpeg'),
+}
+QUALITY = 82
+DERIVATIVES_DIR = 'derivatives'
+
+DERIVATIVE_RE = re.compile(
+    r'^(?P<preset>[a-z]+)@(?P<density>\d)x\.(?P<fmt>[a-z]+)$'
+    )
+
+
+def file_hash(field_file):
+    digest = hashlib.sha1()
+    field_file.open('rb')
+    try:
+        field_file.seek(0)
+        for chunk in field_file.chunks():
+            digest.update(chunk)
+        field_file.seek(0)
+    finally:
+        if field_file._committed:
+            field_file.close()
+    return digest.hexdigest()
+
+
+def derivative_filename(preset, density, fmt):
+    return f'{preset}@{density}x.{fmt}'
+
+
+def derivative_name(image_hash, preset, density, fmt):
+    return f'{DERIVATIVES_DIR}/{image_hash[:2]}/{image_hash}/' \
+        f'{derivative_filename(preset, density, fmt)}'
+
+
+def parse_derivative(filename):
+    match = DERIVATIVE_RE.match(filename)
+    if not match:
+        return None
+    preset, density, fmt = match.group('preset', 'density', 'fmt')
+    density = int(density)
+    if preset not in PRESETS or density not in DENSITIES or fmt not in FORMATS:
+        return None
+    return preset, density, fmt
+
+
+def render_derivative(source, preset, density, fmt):
+    width, height = PRESETS[preset]
+    with Image.open(source) as image:
+        image.draft('RGB', (width * density, height * density))
+        image = image.copy()
+    image.thumbnail((width * density, height * density), Image.LANCZOS)
+    pil_format = FORMATS[fmt][0]
+    if pil_format == 'JPEG' and image.mode != 'RGB':
+        image = image.convert('RGB')
+    elif image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA')
+    output = BytesIO()
+    image.save(output, pil_format, quality=QUALITY, optimize=True)
+    return output.getvalue()
+
+
+def get_or_create_derivative(source_name, image_hash, preset, density, fmt):
+    name = derivative_name(image_hash, preset, density, fmt)
+    if default_storage.exists(name):
+        return name
+    with default_storage.open(source_name, 'rb') as source:
+        content = render_derivative(source, preset, density, fmt)
+    saved_name = default_storage.save(name, ContentFile(content))
+    if saved_name != name:
+        # Another worker rendered the same derivative first.
+        default_storage.delete(saved_name)
+    return name
+
+
+def create_all_derivatives(source_name, image_hash):
+    created = 0
+    for preset in PRESETS:
+        for density in DENSITIES:
+            for fmt in FORMATS:
+                name = derivative_name(image_hash, preset, density, fmt)
+                if not default_storage.exists(name):
+                    get_or_create_derivative(
+                        source_name, image_hash, preset, density, fmt
+                        )
+                    created += 1
+    return created
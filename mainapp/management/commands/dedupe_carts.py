@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from mainapp.dedupe import (dedupe_carts, find_duplicate_lines,
+                            find_duplicate_open_carts)
+from mainapp.models import Cart, CartProduct, Order
+
+
+class Command(BaseCommand):
+
+    help = 'Объединяет дубли строк корзины и открытых корзин покупателя'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true')
+
+    def handle(self, *args, **options):
+        if options['dry_run']:
+            lines = find_duplicate_lines(CartProduct).count()
+            carts = find_duplicate_open_carts(Cart).count()
+            self.stdout.write(
+                f'Товаров с дублями строк: {lines}, '
+                f'покупателей с несколькими открытыми корзинами: {carts}'
+            )
+            return
+        with transaction.atomic():
+            lines, carts = dedupe_carts(Cart, CartProduct, Order)
+        self.stdout.write(self.style.SUCCESS(
+            f'Удалено дублей строк: {lines}, лишних открытых корзин: {carts}'
+        ))
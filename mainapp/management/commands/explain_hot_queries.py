@@ -0,0 +1,50 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+
+from mainapp.models import Cart, CartProduct, Customer, Order
+
+
+class Command(BaseCommand):
+
+    help = 'Печатает планы выполнения самых частых запросов корзины и заказов'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--customer', type=int,
+                            help='id покупателя, по умолчанию самый активный')
+        parser.add_argument('--analyze', action='store_true',
+                            help='выполнить запросы (EXPLAIN ANALYZE)')
+
+    def get_queries(self, customer_id):
+        line = CartProduct.objects.filter(
+            cart__owner_id=customer_id
+            ).values('cart_id', 'product_id').first() or {
+                'cart_id': 0, 'product_id': 0
+            }
+        return {
+            'open_cart': Cart.objects.filter(
+                owner_id=customer_id, in_order=False
+                ),
+            'order_history': Order.objects.filter(
+                customer_id=customer_id
+                ).order_by('-created_at'),
+            'cart_line': CartProduct.objects.filter(
+                cart_id=line['cart_id'], product_id=line['product_id']
+                ),
+        }
+
+    def handle(self, *args, **options):
+        customer_id = options['customer'] or Customer.objects.annotate(
+            n=Count('related_orders')
+            ).order_by('-n').values_list('id', flat=True).first()
+        if customer_id is None:
+            raise CommandError('Нет данных: сначала запустите seed_bench')
+        explain_options = {}
+        if options['analyze']:
+            if connection.vendor != 'postgresql':
+                raise CommandError('--analyze доступен только для PostgreSQL')
+            explain_options = {'analyze': True, 'buffers': True}
+        self.stdout.write(f'Покупатель {customer_id}')
+        for name, queryset in self.get_queries(customer_id).items():
+            self.stdout.write(self.style.MIGRATE_HEADING(name))
+            self.stdout.write(queryset.explain(**explain_options))
@@ -0,0 +1,65 @@
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from mainapp.exports import (EXPORT_FORMATS, ORDER_EXPORT_DATE_FIELDS,
+                             get_order_rows, iter_csv, iter_ndjson,
+                             write_arrow)
+
+
+def date_argument(value):
+    date = parse_date(value)
+    if date is None:
+        raise ValueError(value)
+    return date
+
+
+class Command(BaseCommand):
+
+    help = 'Потоковая выгрузка заказов в CSV, NDJSON или Arrow'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=EXPORT_FORMATS, default='csv')
+        parser.add_argument(
+            '--output', help='файл для выгрузки, по умолчанию stdout'
+            )
+        parser.add_argument(
+            '--date-field', choices=ORDER_EXPORT_DATE_FIELDS,
+            default='created_at'
+            )
+        parser.add_argument('--from', dest='date_from', type=date_argument)
+        parser.add_argument('--to', dest='date_to', type=date_argument)
+        parser.add_argument('--chunk-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        rows = get_order_rows(
+            options['date_field'], options['date_from'], options['date_to'],
+            options['chunk_size']
+            )
+        if options['format'] == 'arrow':
+            if not options['output']:
+                raise CommandError('Для формата arrow укажите --output')
+            try:
+                count = write_arrow(rows, options['output'])
+            except ImportError as e:
+                raise CommandError(str(e))
+        else:
+            lines = iter_csv(rows) if options['format'] == 'csv' \
+                else iter_ndjson(rows)
+            output = open(options['output'], 'w', encoding='utf-8', newline='') \
+                if options['output'] else sys.stdout
+            count = -1 if options['format'] == 'csv' else 0
+            try:
+                for line in lines:
+                    output.write(line)
+                    count += 1
+            finally:
+                if output is not sys.stdout:
+                    output.close()
+        elapsed = time.monotonic() - started
+        self.stderr.write(
+            f'Выгружено {count} заказов за {elapsed:.2f} с'
+        )
@@ -0,0 +1,57 @@
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.core.management.base import BaseCommand
+
+from mainapp.images import create_all_derivatives, file_hash
+from mainapp.models import Product
+
+
+class Command(BaseCommand):
+
+    help = 'Создает уменьшенные копии изображений товаров для всех пресетов'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=None)
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def fill_hashes(self, batch_size):
+        products = Product.objects.filter(image_hash='').exclude(image='')
+        batch = []
+        for product in products.only('id', 'image').iterator():
+            try:
+                product.image_hash = file_hash(product.image)
+            except OSError:
+                self.stderr.write(f'Нет файла {product.image.name}')
+                continue
+            batch.append(product)
+            if len(batch) >= batch_size:
+                Product.objects.bulk_update(batch, ['image_hash'])
+                batch = []
+        if batch:
+            Product.objects.bulk_update(batch, ['image_hash'])
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        self.fill_hashes(options['batch_size'])
+        sources = dict(
+            Product.objects.exclude(image_hash='').values_list(
+                'image_hash', 'image'
+                ).iterator()
+            )
+        created = 0
+        with ProcessPoolExecutor(
+                max_workers=options['workers'],
+                initializer=django.setup) as executor:
+            results = executor.map(
+                create_all_derivatives, sources.values(), sources.keys(),
+                chunksize=16
+                )
+            for count in results:
+                created += count
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Создано {created} копий для {len(sources)} изображений '
+            f'за {elapsed:.2f} с'
+        ))
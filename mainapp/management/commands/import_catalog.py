@@ -0,0 +1,254 @@
+import csv
+import hashlib
+import io
+import json
+import os
+import time
+from decimal import Decimal, InvalidOperation
+
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from mainapp.catalog_cache import catalog_cache
+from mainapp.models import Category, Product
+from mainapp.search import get_search_backend
+from mainapp.utils import chunked
+
+IMPORT_FIELDS = (
+    'title', 'category_id', 'image', 'image_hash', 'description', 'price'
+    )
+IMAGES_DIR = 'products'
+
+STAGING_TABLE = 'import_product_staging'
+STAGING_SQL = f'''
+    CREATE TEMPORARY TABLE IF NOT EXISTS {STAGING_TABLE} (
+        slug varchar(50) PRIMARY KEY,
+        title varchar(255) NOT NULL,
+        category_id integer NOT NULL,
+        image varchar(100) NOT NULL,
+        image_hash varchar(40) NOT NULL,
+        description text,
+        price numeric(9, 2) NOT NULL
+    ) ON COMMIT DELETE ROWS
+'''
+UPSERT_SQL = f'''
+    INSERT INTO {Product._meta.db_table} AS p
+        (slug, title, category_id, image, image_hash, description, price)
+    SELECT slug, title, category_id, image, image_hash, description, price
+    FROM {STAGING_TABLE}
+    ON CONFLICT (slug) DO UPDATE SET
+        title = EXCLUDED.title,
+        category_id = EXCLUDED.category_id,
+        image = COALESCE(NULLIF(EXCLUDED.image, ''), p.image),
+        image_hash = CASE WHEN EXCLUDED.image = '' THEN p.image_hash
+                          ELSE EXCLUDED.image_hash END,
+        description = EXCLUDED.description,
+        price = EXCLUDED.price
+'''
+
+
+class RowError(Exception):
+    pass
+
+
+def source_hash(path):
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(64 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class Command(BaseCommand):
+
+    help = 'Импортирует товары из CSV или JSONL с обновлением по артикулу'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=('csv', 'jsonl'))
+        parser.add_argument('--images-dir')
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument(
+            '--start', type=int, default=0,
+            help='номер строки, с которой продолжить прерванный импорт'
+            )
+        parser.add_argument(
+            '--copy', action='store_true',
+            help='загружать пачки через COPY (только PostgreSQL)'
+            )
+
+    def read_rows(self, path, fmt):
+        with open(path, encoding='utf-8', newline='') as f:
+            if fmt == 'csv':
+                for line_no, row in enumerate(csv.DictReader(f), 1):
+                    yield line_no, row
+            else:
+                for line_no, line in enumerate(f, 1):
+                    if not line.strip():
+                        continue
+                    # A bad line is reported by clean_row and skipped like
+                    # any other invalid row, so --start can move past it.
+                    try:
+                        row = json.loads(line)
+                    except json.JSONDecodeError as e:
+                        row = RowError(f'некорректный JSON: {e}')
+                    else:
+                        if not isinstance(row, dict):
+                            row = RowError('строка должна быть JSON-объектом')
+                    yield line_no, row
+
+    def attach_image(self, name):
+        if not name:
+            return '', ''
+        if not self.images_dir:
+            raise RowError('изображение указано, но не задан --images-dir')
+        path = os.path.join(self.images_dir, name)
+        try:
+            image_hash = source_hash(path)
+        except OSError:
+            raise RowError(f'нет файла {path}')
+        ext = os.path.splitext(name)[1].lower()
+        target = f'{IMAGES_DIR}/{image_hash[:2]}/{image_hash}{ext}'
+        if not default_storage.exists(target):
+            with open(path, 'rb') as f:
+                target = default_storage.save(target, File(f))
+        return target, image_hash
+
+    def clean_row(self, row):
+        if isinstance(row, RowError):
+            raise row
+        slug = (row.get('slug') or '').strip()
+        if not slug:
+            raise RowError('не указан артикул')
+        category_id = self.categories.get(row.get('category'))
+        if category_id is None:
+            raise RowError(f'неизвестная категория {row.get("category")!r}')
+        try:
+            price = Decimal(str(row.get('price'))).quantize(Decimal('0.01'))
+        except (InvalidOperation, ValueError):
+            raise RowError(f'некорректная цена {row.get("price")!r}')
+        image, image_hash = self.attach_image(row.get('image'))
+        return {
+            'slug': slug,
+            'title': row.get('title') or slug,
+            'category_id': category_id,
+            'image': image,
+            'image_hash': image_hash,
+            'description': row.get('description') or None,
+            'price': price,
+        }
+
+    def upsert_orm(self, rows):
+        existing = Product.objects.only('id', 'slug', 'image', 'image_hash') \
+            .in_bulk(rows.keys(), field_name='slug')
+        to_update = []
+        to_create = []
+        for slug, data in rows.items():
+            product = existing.get(slug)
+            if product is None:
+                to_create.append(Product(slug=slug, **{
+                    field: data[field] for field in IMPORT_FIELDS
+                }))
+                continue
+            for field in IMPORT_FIELDS:
+                if field in ('image', 'image_hash') and not data['image']:
+                    continue
+                setattr(product, field, data[field])
+            to_update.append(product)
+        Product.objects.bulk_update(to_update, IMPORT_FIELDS)
+        Product.objects.bulk_create(to_create)
+
+    def upsert_copy(self, rows):
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for slug, data in rows.items():
+            writer.writerow([slug] + [
+                r'\N' if data[field] is None else data[field]
+                for field in IMPORT_FIELDS
+            ])
+        buffer.seek(0)
+        with connection.cursor() as cursor:
+            cursor.execute(STAGING_SQL)
+            cursor.copy_expert(
+                f'COPY {STAGING_TABLE} (slug, {", ".join(IMPORT_FIELDS)}) '
+                "FROM STDIN WITH (FORMAT csv, NULL '\\N')",
+                buffer
+            )
+            cursor.execute(UPSERT_SQL)
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format'] or (
+            'jsonl' if path.endswith(('.jsonl', '.ndjson')) else 'csv'
+            )
+        if options['copy'] and connection.vendor != 'postgresql':
+            raise CommandError('--copy доступен только для PostgreSQL')
+        self.images_dir = options['images_dir']
+        self.categories = dict(Category.objects.values_list('slug', 'id'))
+        upsert = self.upsert_copy if options['copy'] else self.upsert_orm
+        search_backend = get_search_backend()
+
+        started = time.monotonic()
+        imported = skipped = 0
+        last_line = options['start']
+        rows = (
+            (line_no, row) for line_no, row in self.read_rows(path, fmt)
+            if line_no > options['start']
+        )
+        try:
+            for batch in chunked(rows, options['batch_size']):
+                cleaned = {}
+                for line_no, row in batch:
+                    try:
+                        data = self.clean_row(row)
+                    except RowError as e:
+                        self.stderr.write(f'Строка {line_no}: {e}')
+                        skipped += 1
+                        continue
+                    cleaned[data['slug']] = data
+                without_image = [
+                    slug for slug, data in cleaned.items() if not data['image']
+                ]
+                if without_image:
+                    known = set(Product.objects.filter(
+                        slug__in=without_image
+                        ).values_list('slug', flat=True))
+                    for slug in set(without_image) - known:
+                        self.stderr.write(
+                            f'{slug}: для нового товара нужно изображение'
+                            )
+                        del cleaned[slug]
+                        skipped += 1
+                with transaction.atomic():
+                    upsert(cleaned)
+                    if not search_backend.indexed_by_database:
+                        search_backend.index_products(
+                            Product.objects.filter(slug__in=cleaned.keys())
+                            .only('id', 'title', 'description')
+                        )
+                imported += len(cleaned)
+                last_line = batch[-1][0]
+                elapsed = time.monotonic() - started
+                self.stdout.write(
+                    f'Строка {last_line}: импортировано {imported}, '
+                    f'{imported / max(elapsed, 1e-9):.0f} строк/с'
+                )
+        except ValueError as e:
+            raise CommandError(
+                f'{e}. Импорт остановлен, продолжите с --start {last_line}'
+                )
+        except BaseException:
+            self.stderr.write(
+                f'Импорт остановлен, продолжите с --start {last_line}'
+                )
+            raise
+        finally:
+            catalog_cache.invalidate()
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Импортировано {imported} товаров, пропущено {skipped} строк '
+            f'за {elapsed:.2f} с ({imported / max(elapsed, 1e-9):.0f} строк/с)'
+        ))
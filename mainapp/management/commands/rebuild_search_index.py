@@ -0,0 +1,23 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from mainapp.search import get_search_backend
+
+
+class Command(BaseCommand):
+
+    help = 'Перестраивает полнотекстовый индекс товаров'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=10000)
+
+    def handle(self, *args, **options):
+        backend = get_search_backend()
+        started = time.monotonic()
+        count = backend.rebuild(batch_size=options['batch_size'])
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'{backend.__class__.__name__}: проиндексировано {count} товаров '
+            f'за {elapsed:.2f} с'
+        ))
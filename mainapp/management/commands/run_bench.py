@@ -0,0 +1,206 @@
+import json
+import random
+import re
+import statistics
+import subprocess
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test import Client, override_settings
+from django.utils import timezone
+
+from mainapp.models import Category, Customer, Product
+
+from .seed_bench import USERNAME_PREFIX
+
+IDEMPOTENCY_KEY_RE = re.compile(rb'name="idempotency_key" value="(\w+)"')
+
+
+class QueryCounter:
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+            cwd=settings.BASE_DIR, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+
+    help = 'Прогоняет сценарии покупателя по реальным URL и пишет отчет в JSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=20,
+                            help='сколько покупателей проходит сценарий')
+        parser.add_argument('--iterations', type=int, default=5)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output', help='файл для JSON-отчета')
+        parser.add_argument('--compare',
+                            help='JSON-отчет предыдущего прогона')
+        parser.add_argument(
+            '--max-regression', type=float, default=None,
+            help='допустимый рост p95 в процентах, иначе код выхода 1'
+            )
+
+    def request(self, client, name, method, url, **data):
+        counter = QueryCounter()
+        started = time.perf_counter()
+        with connections['default'].execute_wrapper(counter):
+            response = getattr(client, method)(url, data or None)
+            if hasattr(response, 'streaming_content'):
+                b''.join(response.streaming_content)
+        elapsed = time.perf_counter() - started
+        sample = self.samples[name]
+        sample['latencies'].append(elapsed)
+        sample['queries'].append(counter.count)
+        if response.status_code >= 400:
+            sample['errors'] += 1
+        return response
+
+    def scenario(self, client, category, products):
+        product = self.rnd.choice(products)
+        query = product.title.split()[0]
+        self.request(client, 'browse', 'get', '/')
+        self.request(client, 'category', 'get', f'/category/{category.slug}/')
+        self.request(
+            client, 'category_sorted', 'get',
+            f'/category/{category.slug}/', sort='-price'
+            )
+        self.request(client, 'product', 'get', f'/products/{product.slug}/')
+        self.request(client, 'search', 'get', '/search/', q=query)
+        self.request(client, 'nav', 'get', '/nav/')
+        self.request(client, 'add_to_cart', 'get',
+                     f'/add-to-cart/{product.slug}/')
+        self.request(client, 'cart', 'get', '/cart/')
+        self.request(client, 'change_qty', 'post',
+                     f'/change-qty/{product.slug}/', qty=2)
+        response = self.request(client, 'checkout', 'get', '/checkout/')
+        match = IDEMPOTENCY_KEY_RE.search(response.content)
+        self.request(
+            client, 'make_order', 'post', '/make-order/',
+            first_name='Бенч', last_name='Тест', phone='+70000000000',
+            address='Адрес', buying_type='self',
+            order_date=timezone.localdate().isoformat(), comment='',
+            idempotency_key=match.group(1).decode() if match else ''
+            )
+        self.request(client, 'profile', 'get', '/profile/')
+        self.request(client, 'api_category_products', 'get',
+                     f'/api/categories/{category.slug}/products/')
+        self.request(client, 'api_search', 'get', '/api/search/', q=query)
+
+    def summarize(self, elapsed):
+        endpoints = {}
+        for name, sample in self.samples.items():
+            latencies = sample['latencies']
+            endpoints[name] = {
+                'requests': len(latencies),
+                'errors': sample['errors'],
+                'mean_ms': statistics.mean(latencies) * 1000,
+                'p50_ms': percentile(latencies, 50) * 1000,
+                'p95_ms': percentile(latencies, 95) * 1000,
+                'p99_ms': percentile(latencies, 99) * 1000,
+                'queries_mean': statistics.mean(sample['queries']),
+                'queries_max': max(sample['queries']),
+            }
+        total = sum(endpoint['requests'] for endpoint in endpoints.values())
+        return {
+            'commit': git_commit(),
+            'created_at': timezone.now().isoformat(),
+            'database': connections['default'].vendor,
+            'products': Product.objects.count(),
+            'duration_s': elapsed,
+            'requests': total,
+            'rps': total / elapsed,
+            'endpoints': endpoints,
+        }
+
+    def print_report(self, report, baseline):
+        self.stdout.write(
+            f'{"endpoint":<24}{"req":>6}{"err":>5}{"p50 ms":>9}'
+            f'{"p95 ms":>9}{"p99 ms":>9}{"queries":>9}{"Δp95":>8}'
+        )
+        regressions = []
+        for name, data in report['endpoints'].items():
+            delta = ''
+            old = (baseline or {}).get('endpoints', {}).get(name)
+            if old and old['p95_ms']:
+                change = (data['p95_ms'] / old['p95_ms'] - 1) * 100
+                delta = f'{change:+.0f}%'
+                regressions.append((name, change))
+            self.stdout.write(
+                f'{name:<24}{data["requests"]:>6}{data["errors"]:>5}'
+                f'{data["p50_ms"]:>9.1f}{data["p95_ms"]:>9.1f}'
+                f'{data["p99_ms"]:>9.1f}{data["queries_mean"]:>9.1f}'
+                f'{delta:>8}'
+            )
+        self.stdout.write(
+            f'{report["requests"]} запросов за {report["duration_s"]:.1f} с, '
+            f'{report["rps"]:.1f} запросов/с'
+        )
+        return regressions
+
+    def handle(self, *args, **options):
+        self.rnd = random.Random(options['seed'])
+        self.samples = defaultdict(
+            lambda: {'latencies': [], 'queries': [], 'errors': 0}
+            )
+        customers = list(Customer.objects.filter(
+            user__username__startswith=USERNAME_PREFIX
+            ).select_related('user').order_by('id')[:options['users']])
+        if not customers:
+            raise CommandError('Нет данных: сначала запустите seed_bench')
+        categories = list(Category.objects.all())
+        products = {
+            category.id: list(Product.objects.filter(
+                category=category
+                ).only('id', 'slug', 'title').order_by('id')[:200])
+            for category in categories
+        }
+        categories = [category for category in categories
+                      if products[category.id]]
+
+        started = time.perf_counter()
+        with override_settings(
+                ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']):
+            for _ in range(options['iterations']):
+                for customer in customers:
+                    client = Client()
+                    client.force_login(customer.user)
+                    category = self.rnd.choice(categories)
+                    self.scenario(client, category, products[category.id])
+        report = self.summarize(time.perf_counter() - started)
+
+        baseline = None
+        if options['compare']:
+            with open(options['compare']) as f:
+                baseline = json.load(f)
+        regressions = self.print_report(report, baseline)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(report, f, indent=2, ensure_ascii=False)
+        limit = options['max_regression']
+        failed = [name for name, change in regressions
+                  if limit is not None and change > limit]
+        if failed:
+            raise CommandError(
+                f'p95 вырос больше чем на {limit}%: {", ".join(failed)}'
+                )
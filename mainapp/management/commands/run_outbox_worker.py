@@ -0,0 +1,49 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+
+from mainapp.outbox import process_batch
+
+
+class Command(BaseCommand):
+
+    help = 'Обрабатывает события из outbox в пуле потоков'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=4)
+        parser.add_argument('--batch-size', type=int, default=100)
+        parser.add_argument(
+            '--poll-interval', type=float, default=1.0,
+            help='пауза в секундах, когда очередь пуста'
+            )
+        parser.add_argument(
+            '--once', action='store_true',
+            help='обработать доступные события и завершиться'
+            )
+
+    def handle(self, *args, **options):
+        processed = 0
+        started = time.monotonic()
+        with ThreadPoolExecutor(max_workers=options['threads']) as executor:
+            try:
+                while True:
+                    done, failed = process_batch(
+                        executor, options['batch_size']
+                        )
+                    processed += len(done)
+                    for event, error in failed:
+                        self.stderr.write(
+                            f'{event}: попытка {event.attempts + 1}, {error!r}'
+                            )
+                    if done or failed:
+                        continue
+                    if options['once']:
+                        break
+                    time.sleep(options['poll_interval'])
+            except KeyboardInterrupt:
+                pass
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Обработано {processed} событий за {elapsed:.2f} с'
+        ))
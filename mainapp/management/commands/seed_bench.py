@@ -0,0 +1,251 @@
+import random
+import time
+from array import array
+from collections import Counter
+from contextlib import contextmanager
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from mainapp.catalog_cache import catalog_cache
+from mainapp.images import file_hash
+from mainapp.models import (Cart, CartProduct, Category, Customer, Order,
+                            OrderProduct, Product, User)
+from mainapp.search import get_search_backend
+from mainapp.utils import chunked, summarize_order_lines
+
+USERNAME_PREFIX = 'bench_'
+CATEGORY_PREFIX = 'bench-'
+BENCH_PASSWORD = 'bench'
+
+WORDS = (
+    'смартфон', 'ноутбук', 'планшет', 'чехол', 'зарядка', 'наушники',
+    'экран', 'камера', 'процессор', 'память', 'корпус', 'кабель', 'pro',
+    'max', 'lite', 'mini', 'ultra', 'plus', 'air', 'neo',
+)
+SEEDED_MODELS = (
+    Category, Product, User, Customer, Cart, CartProduct, Order, OrderProduct
+)
+
+
+def product_title(pk):
+    return ' '.join(
+        WORDS[pk * step % len(WORDS)] for step in (1, 7, 13)
+    ) + f' {pk}'
+
+
+@contextmanager
+def manual_created_at():
+    field = Order._meta.get_field('created_at')
+    field.auto_now_add = False
+    try:
+        yield
+    finally:
+        field.auto_now_add = True
+
+
+class Command(BaseCommand):
+
+    help = 'Генерирует синтетический каталог, покупателей и заказы ' \
+        'для нагрузочных тестов'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--categories', type=int, default=10)
+        parser.add_argument('--products', type=int, default=100000)
+        parser.add_argument('--customers', type=int, default=10000)
+        parser.add_argument('--orders', type=int, default=50000)
+        parser.add_argument('--lines', type=int, default=3,
+                            help='максимум строк в корзине и заказе')
+        parser.add_argument('--days', type=int, default=365,
+                            help='за сколько дней распределить заказы')
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--clear', action='store_true',
+                            help='удалить ранее сгенерированные данные')
+
+    def report(self, name, total):
+        elapsed = time.monotonic() - self.started
+        self.stdout.write(f'{name}: {total} строк ({elapsed:.1f} с)')
+
+    def bulk(self, model, objects):
+        total = 0
+        for batch in chunked(objects, self.batch_size):
+            with transaction.atomic():
+                model.objects.bulk_create(batch)
+            total += len(batch)
+        self.report(model.__name__, total)
+
+    def get_image(self):
+        product = Product.objects.exclude(image='').only(
+            'image', 'image_hash'
+            ).first()
+        if product:
+            return product.image.name, product.image_hash
+        name = 'bench.jpg'
+        if default_storage.exists(name):
+            return name, file_hash(default_storage.open(name))
+        return name, ''
+
+    def clear(self):
+        User.objects.filter(username__startswith=USERNAME_PREFIX).delete()
+        Category.objects.filter(slug__startswith=CATEGORY_PREFIX).delete()
+        self.stdout.write('Старые данные удалены')
+
+    def next_id(self, model):
+        self.last_ids[model] += 1
+        return self.last_ids[model]
+
+    def seed_catalog(self, options, run):
+        image, image_hash = self.image = self.get_image()
+        category_ids = [
+            self.next_id(Category) for _ in range(options['categories'])
+        ]
+        self.bulk(Category, (
+            Category(id=pk, name=f'Категория {pk}',
+                     slug=f'{CATEGORY_PREFIX}{run}-{pk}')
+            for pk in category_ids
+        ))
+        self.first_product_id = self.last_ids[Product] + 1
+        self.prices = array('q', (
+            self.rnd.randrange(100, 20000000)
+            for _ in range(options['products'])
+        ))
+
+        def products():
+            for offset, cents in enumerate(self.prices):
+                pk = self.next_id(Product)
+                yield Product(
+                    id=pk, category_id=self.rnd.choice(category_ids),
+                    title=product_title(pk),
+                    slug=f'{CATEGORY_PREFIX}{run}-{pk}', image=image,
+                    image_hash=image_hash, price=Decimal(cents) / 100,
+                    description=' '.join(self.rnd.choices(WORDS, k=12))
+                )
+        self.bulk(Product, products())
+
+    def seed_customers(self, options, run):
+        password = make_password(BENCH_PASSWORD)
+        user_ids = [self.next_id(User) for _ in range(options['customers'])]
+        self.bulk(User, (
+            User(id=pk, username=f'{USERNAME_PREFIX}{run}_{pk}',
+                 password=password, email=f'{pk}@bench.local')
+            for pk in user_ids
+        ))
+        self.customer_ids = [self.next_id(Customer) for _ in user_ids]
+        self.bulk(Customer, (
+            Customer(id=pk, user_id=user_id)
+            for pk, user_id in zip(self.customer_ids, user_ids)
+        ))
+
+    def cart_jobs(self, options):
+        for customer_id in self.customer_ids:
+            yield customer_id, None
+        now = timezone.now()
+        for _ in range(options['orders']):
+            yield self.rnd.choice(self.customer_ids), now - timedelta(
+                seconds=self.rnd.randrange(options['days'] * 86400)
+                )
+
+    def seed_carts(self, options):
+        totals = Counter()
+        for batch in chunked(self.cart_jobs(options), self.batch_size):
+            rows = {model: [] for model in (
+                Cart, CartProduct, Order, OrderProduct
+            )}
+            for customer_id, created_at in batch:
+                cart = Cart(
+                    id=self.next_id(Cart), owner_id=customer_id,
+                    total_products=0, final_price=0,
+                    in_order=created_at is not None
+                    )
+                rows[Cart].append(cart)
+                if created_at is not None:
+                    order = Order(
+                        id=self.next_id(Order), customer_id=customer_id,
+                        cart_id=cart.id, first_name='Имя',
+                        last_name='Фамилия', phone='+70000000000',
+                        address='Адрес',
+                        status=self.rnd.choice(Order.STATUS_CHOICES)[0],
+                        buying_type=self.rnd.choice(
+                            Order.BUYING_TYPE_CHOICES
+                            )[0],
+                        created_at=created_at,
+                        order_date=(created_at + timedelta(days=2)).date()
+                    )
+                    rows[Order].append(order)
+                    order_lines = []
+                offsets = self.rnd.sample(
+                    range(len(self.prices)),
+                    self.rnd.randint(1, options['lines'])
+                    )
+                for offset in offsets:
+                    product_id = self.first_product_id + offset
+                    price = Decimal(self.prices[offset]) / 100
+                    qty = self.rnd.randint(1, 3)
+                    line = CartProduct(
+                        id=self.next_id(CartProduct), user_id=customer_id,
+                        cart_id=cart.id, product_id=product_id, qty=qty,
+                        final_price=qty * price
+                        )
+                    rows[CartProduct].append(line)
+                    cart.total_products += 1
+                    cart.final_price += line.final_price
+                    if created_at is not None:
+                        title = product_title(product_id)
+                        rows[OrderProduct].append(OrderProduct(
+                            id=self.next_id(OrderProduct), order_id=order.id,
+                            product_id=product_id, title=title, price=price,
+                            qty=qty, final_price=line.final_price
+                        ))
+                        order_lines.append(
+                            (title, *self.image, qty, line.final_price)
+                        )
+                if created_at is not None:
+                    for field, value in summarize_order_lines(
+                            order_lines).items():
+                        setattr(order, field, value)
+            with transaction.atomic(), manual_created_at():
+                for model, objects in rows.items():
+                    model.objects.bulk_create(objects)
+                    totals[model.__name__] += len(objects)
+            self.report('Корзины и заказы', totals['Cart'])
+        for name, total in totals.items():
+            self.report(name, total)
+
+    def handle(self, *args, **options):
+        self.started = time.monotonic()
+        self.batch_size = options['batch_size']
+        self.rnd = random.Random(options['seed'])
+        if options['clear']:
+            self.clear()
+        self.last_ids = {
+            model: model.objects.aggregate(m=Max('id'))['m'] or 0
+            for model in SEEDED_MODELS
+        }
+        run = f'{int(time.time()):x}'
+
+        self.seed_catalog(options, run)
+        self.seed_customers(options, run)
+        self.seed_carts(options)
+        call_command('backfill_sales_rollups', verbosity=0)
+        self.report('Сводки продаж', options['orders'])
+
+        with connection.cursor() as cursor:
+            for sql in connection.ops.sequence_reset_sql(
+                    no_style(), list(SEEDED_MODELS)):
+                cursor.execute(sql)
+        get_search_backend().rebuild()
+        catalog_cache.invalidate()
+
+        elapsed = time.monotonic() - self.started
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово за {elapsed:.1f} с. Пароль покупателей: {BENCH_PASSWORD}'
+        ))
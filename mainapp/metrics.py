@@ -0,0 +1,366 @@
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+from contextvars import ContextVar
+from pathlib import Path
+
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from django.template.backends.django import DjangoTemplates, Template
+from django.utils.crypto import constant_time_compare
+from django.utils.decorators import sync_and_async_middleware
+
+from .catalog_cache import catalog_cache
+
+LATENCY_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0
+)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+HELP = {
+    'shop_http_requests_total': ('counter', 'HTTP requests by view'),
+    'shop_http_request_duration_seconds': (
+        'histogram', 'Request latency by view'
+        ),
+    'shop_db_queries_per_request': (
+        'histogram', 'Database queries per request by view'
+        ),
+    'shop_db_query_duration_seconds_total': (
+        'counter', 'Time spent in database queries by view'
+        ),
+    'shop_template_render_duration_seconds': (
+        'histogram', 'Top-level template render time'
+        ),
+    'shop_catalog_cache_requests_total': (
+        'counter', 'Catalog cache lookups by result'
+        ),
+    'shop_catalog_cache_hit_ratio': (
+        'gauge', 'Share of catalog cache lookups served from a cache'
+        ),
+}
+
+current_request = ContextVar('metrics_request', default=None)
+
+logger = logging.getLogger(__name__)
+
+
+class RequestStats:
+
+    __slots__ = ('queries', 'db_time')
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+
+
+class Registry:
+    # Plain dicts updated under the GIL: no locks on the request path, at the
+    # price of a rare lost increment when two threads hit the same key. Only
+    # flushing takes a lock, so that one thread at a time writes the file.
+
+    def __init__(self):
+        self.counters = {}
+        self.histograms = {}
+        self.flushed_at = 0.0
+        self.flush_lock = threading.Lock()
+
+    def inc(self, name, labels, value=1):
+        key = (name, labels)
+        self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, labels, value, buckets):
+        key = (name, labels)
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            histogram = self.histograms[key] = [
+                list(buckets), [0] * len(buckets), 0.0, 0
+            ]
+        counts = histogram[1]
+        for i, bound in enumerate(buckets):
+            if value <= bound:
+                counts[i] += 1
+                break
+        histogram[2] += value
+        histogram[3] += 1
+
+    def snapshot(self):
+        cache_stats = catalog_cache.stats()
+        counters = [
+            [name, list(labels), value]
+            for (name, labels), value in list(self.counters.items())
+        ]
+        for result in ('local_hits', 'shared_hits', 'misses'):
+            counters.append([
+                'shop_catalog_cache_requests_total',
+                [['result', result]],
+                cache_stats[result]
+            ])
+        return {
+            'counters': counters,
+            'histograms': [
+                [name, list(labels), *histogram]
+                for (name, labels), histogram in list(self.histograms.items())
+            ],
+        }
+
+    def write(self):
+        directory = settings.METRICS_DIR
+        self.flushed_at = time.monotonic()
+        if not directory:
+            return
+        os.makedirs(directory, exist_ok=True)
+        path = Path(directory) / f'metrics-{os.getpid()}.json'
+        tmp_path = path.with_name(
+            f'{path.stem}-{threading.get_ident()}.tmp'
+            )
+        try:
+            tmp_path.write_text(json.dumps(self.snapshot()))
+            os.replace(tmp_path, path)
+        finally:
+            if tmp_path.exists():
+                tmp_path.unlink()
+
+    def flush_due(self):
+        return bool(settings.METRICS_DIR) and (
+            time.monotonic() - self.flushed_at
+            > settings.METRICS_FLUSH_INTERVAL
+        )
+
+    def maybe_flush(self):
+        # Called after every request: a failed write must not fail the
+        # request, and a flush already running in another thread is enough.
+        if not self.flush_due() or not self.flush_lock.acquire(False):
+            return
+        try:
+            if self.flush_due():
+                self.write()
+        except OSError:
+            logger.exception('Could not flush metrics to %s',
+                             settings.METRICS_DIR)
+        finally:
+            self.flush_lock.release()
+
+
+registry = Registry()
+
+
+def is_running(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def read_snapshots(directory):
+    snapshots = []
+    for path in Path(directory).glob('metrics-*.json'):
+        pid = path.stem.split('-', 1)[1]
+        if pid == str(os.getpid()):
+            continue
+        if pid.isdigit() and not is_running(int(pid)):
+            # The worker is gone; its counts restart with its replacement.
+            try:
+                path.unlink()
+            except OSError:
+                pass
+            continue
+        try:
+            snapshots.append(json.loads(path.read_text()))
+        except (OSError, ValueError):
+            continue
+    return snapshots
+
+
+def collect():
+    # This worker reports its live counters, other workers their files.
+    registry.maybe_flush()
+    snapshots = [registry.snapshot()]
+    if settings.METRICS_DIR:
+        snapshots += read_snapshots(settings.METRICS_DIR)
+
+    counters = {}
+    histograms = {}
+    for snapshot in snapshots:
+        for name, labels, value in snapshot['counters']:
+            key = (name, tuple(map(tuple, labels)))
+            counters[key] = counters.get(key, 0) + value
+        for name, labels, buckets, counts, total, count in \
+                snapshot['histograms']:
+            key = (name, tuple(map(tuple, labels)))
+            merged = histograms.setdefault(
+                key, [buckets, [0] * len(buckets), 0.0, 0]
+                )
+            merged[1] = [a + b for a, b in zip(merged[1], counts)]
+            merged[2] += total
+            merged[3] += count
+    return counters, histograms
+
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(
+        '{}="{}"'.format(
+            name,
+            str(value).replace('\\', r'\\').replace('"', r'\"')
+            .replace('\n', r'\n')
+        )
+        for name, value in labels
+    ) + '}'
+
+
+def is_scraper_allowed(request):
+    if request.META.get('REMOTE_ADDR') in settings.METRICS_ALLOWED_IPS:
+        return True
+    token = settings.METRICS_TOKEN
+    return bool(token) and constant_time_compare(
+        request.META.get('HTTP_AUTHORIZATION', ''), f'Bearer {token}'
+        )
+
+
+def render_metrics():
+    counters, histograms = collect()
+    cache_requests = {
+        dict(labels)['result']: value
+        for (name, labels), value in counters.items()
+        if name == 'shop_catalog_cache_requests_total'
+    }
+    cache_total = sum(cache_requests.values())
+    hit_ratio = (
+        (cache_total - cache_requests.get('misses', 0)) / cache_total
+        if cache_total else 0
+    )
+
+    lines = []
+    described = set()
+
+    def describe(name):
+        if name not in described:
+            described.add(name)
+            kind, help_text = HELP.get(name, ('untyped', name))
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {kind}')
+
+    for (name, labels), value in sorted(counters.items()):
+        describe(name)
+        lines.append(f'{name}{format_labels(labels)} {value}')
+    for (name, labels), (buckets, counts, total, count) in \
+            sorted(histograms.items()):
+        describe(name)
+        cumulative = 0
+        for bound, bucket_count in zip(buckets, counts):
+            cumulative += bucket_count
+            lines.append(
+                f'{name}_bucket{format_labels(labels + (("le", bound),))} '
+                f'{cumulative}'
+            )
+        lines.append(
+            f'{name}_bucket{format_labels(labels + (("le", "+Inf"),))} '
+            f'{count}'
+        )
+        lines.append(f'{name}_sum{format_labels(labels)} {total}')
+        lines.append(f'{name}_count{format_labels(labels)} {count}')
+    describe('shop_catalog_cache_hit_ratio')
+    lines.append(f'shop_catalog_cache_hit_ratio {hit_ratio}')
+    return '\n'.join(lines) + '\n'
+
+
+def record_query(execute, sql, params, many, context):
+    stats = current_request.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.queries += 1
+        stats.db_time += time.perf_counter() - started
+
+
+@receiver(connection_created)
+def install_query_recorder(sender, connection, **kwargs):
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+class TimedTemplate(Template):
+
+    def render(self, context=None, request=None):
+        started = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            registry.observe(
+                'shop_template_render_duration_seconds',
+                (('template', self.template.name or '<string>'),),
+                time.perf_counter() - started, LATENCY_BUCKETS
+            )
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+
+    def from_string(self, template_code):
+        return TimedTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        template = super().get_template(template_name)
+        return TimedTemplate(template.template, self)
+
+
+def record_request(request, response, stats, started):
+    match = request.resolver_match
+    view = (match.url_name or match.view_name) if match else 'unmatched'
+    labels = (('view', view),)
+    registry.inc('shop_http_requests_total', labels + (
+        ('method', request.method), ('status', str(response.status_code))
+    ))
+    registry.observe(
+        'shop_http_request_duration_seconds', labels,
+        time.perf_counter() - started, LATENCY_BUCKETS
+    )
+    registry.observe(
+        'shop_db_queries_per_request', labels, stats.queries, QUERY_BUCKETS
+    )
+    registry.inc(
+        'shop_db_query_duration_seconds_total', labels, stats.db_time
+    )
+
+
+@sync_and_async_middleware
+def metrics_middleware(get_response):
+    if asyncio.iscoroutinefunction(get_response):
+        async def middleware(request):
+            stats = RequestStats()
+            token = current_request.set(stats)
+            started = time.perf_counter()
+            try:
+                response = await get_response(request)
+            finally:
+                current_request.reset(token)
+            record_request(request, response, stats, started)
+            if registry.flush_due():
+                # Write the file in a thread instead of blocking the loop.
+                asyncio.get_running_loop().run_in_executor(
+                    None, registry.maybe_flush
+                    )
+            return response
+    else:
+        def middleware(request):
+            stats = RequestStats()
+            token = current_request.set(stats)
+            started = time.perf_counter()
+            try:
+                response = get_response(request)
+            finally:
+                current_request.reset(token)
+            record_request(request, response, stats, started)
+            registry.maybe_flush()
+            return response
+    return middleware
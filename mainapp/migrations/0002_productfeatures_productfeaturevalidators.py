@@ -0,0 +1,36 @@
+# Generated by Django 3.1.2 on 2026-10-18 04:19
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mainapp', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductFeatures',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('feature_key', models.CharField(max_length=100, verbose_name='ключ характеристики')),
+                ('feature_name', models.CharField(max_length=255, verbose_name='наименование характеристики')),
+                ('postfix_for_value', models.CharField(blank=True, help_text='например для характеристики "Часы работы" к значению можно добавить постфикс "часов" и как результат значение "10 часов"', max_length=20, null=True, verbose_name='постфикс для значения')),
+                ('use_in_filter', models.BooleanField(default=False, verbose_name='использовать в фильтрации товаров в шаблоне')),
+                ('filter_type', models.CharField(choices=[('radio', 'радиокнопка'), ('checkbox', 'Чекбокс')], default='checkbox', max_length=20, verbose_name='тип фильтра')),
+                ('filter_measure', models.CharField(help_text='единица измерения для конкретного фильтра', max_length=50, verbose_name='единица измерения для фильтра')),
+                ('category', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='mainapp.category', verbose_name='категории')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ProductFeatureValidators',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('feature_value', models.CharField(blank=True, max_length=255, null=True, unique=True, verbose_name='значение характеристики')),
+                ('category', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='mainapp.category', verbose_name='категории')),
+                ('feature', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='mainapp.productfeatures', verbose_name='характеристики')),
+            ],
+        ),
+    ]
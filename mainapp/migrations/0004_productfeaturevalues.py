@@ -0,0 +1,31 @@
+# Generated by Django 3.1.2 on 2026-10-18 04:21
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mainapp', '0003_product_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductFeatureValues',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('value', models.CharField(max_length=255, verbose_name='значение характеристики')),
+                ('feature', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='mainapp.productfeatures', verbose_name='характеристика')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='feature_values', to='mainapp.product', verbose_name='товар')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='productfeaturevalues',
+            index=models.Index(fields=['feature', 'value'], name='feature_value_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='productfeaturevalues',
+            unique_together={('product', 'feature', 'value')},
+        ),
+    ]
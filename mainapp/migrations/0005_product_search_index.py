@@ -0,0 +1,65 @@
+from django.db import migrations
+
+POSTGRES_FORWARD = [
+    'ALTER TABLE mainapp_product ADD COLUMN search_vector tsvector',
+    """
+    CREATE FUNCTION mainapp_product_search_vector_update() RETURNS trigger AS $$
+    BEGIN
+        NEW.search_vector :=
+            setweight(to_tsvector('russian', coalesce(NEW.title, '')), 'A') ||
+            setweight(to_tsvector('russian', coalesce(NEW.description, '')), 'B');
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE TRIGGER mainapp_product_search_vector_trigger
+    BEFORE INSERT OR UPDATE OF title, description ON mainapp_product
+    FOR EACH ROW EXECUTE PROCEDURE mainapp_product_search_vector_update()
+    """,
+    """
+    UPDATE mainapp_product SET search_vector =
+        setweight(to_tsvector('russian', coalesce(title, '')), 'A') ||
+        setweight(to_tsvector('russian', coalesce(description, '')), 'B')
+    """,
+    'CREATE INDEX mainapp_product_search_vector_idx '
+    'ON mainapp_product USING gin(search_vector)',
+]
+
+POSTGRES_BACKWARD = [
+    'DROP TRIGGER mainapp_product_search_vector_trigger ON mainapp_product',
+    'DROP FUNCTION mainapp_product_search_vector_update()',
+    'ALTER TABLE mainapp_product DROP COLUMN search_vector',
+]
+
+SQLITE_FORWARD = [
+    'CREATE VIRTUAL TABLE mainapp_product_fts USING fts5(title, description)',
+    'INSERT INTO mainapp_product_fts(rowid, title, description) '
+    'SELECT id, title, description FROM mainapp_product',
+]
+
+SQLITE_BACKWARD = [
+    'DROP TABLE mainapp_product_fts',
+]
+
+
+def run(statements):
+    def execute(apps, schema_editor):
+        statements_for_vendor = statements.get(schema_editor.connection.vendor)
+        for statement in statements_for_vendor or []:
+            schema_editor.execute(statement)
+    return execute
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mainapp', '0004_productfeaturevalues'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            run({'postgresql': POSTGRES_FORWARD, 'sqlite': SQLITE_FORWARD}),
+            run({'postgresql': POSTGRES_BACKWARD, 'sqlite': SQLITE_BACKWARD}),
+        ),
+    ]
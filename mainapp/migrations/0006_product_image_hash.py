@@ -0,0 +1,18 @@
+# Generated by Django 3.1.2 on 2026-10-18 04:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mainapp', '0005_product_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='image_hash',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=40, verbose_name='хеш изображения'),
+        ),
+    ]
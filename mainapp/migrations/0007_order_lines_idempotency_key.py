@@ -0,0 +1,75 @@
+# Generated by Django 3.1.2 on 2026-10-18 04:29
+
+from django.db import migrations, models
+import django.db.models.deletion
+from decimal import Decimal
+
+
+def snapshot_order_lines(apps, schema_editor):
+    Order = apps.get_model('mainapp', 'Order')
+    CartProduct = apps.get_model('mainapp', 'CartProduct')
+    OrderProduct = apps.get_model('mainapp', 'OrderProduct')
+    carts = dict(
+        Order.objects.filter(cart__isnull=False).values_list('cart_id', 'id')
+        )
+    lines = CartProduct.objects.filter(cart_id__in=carts).select_related(
+        'product'
+        ).iterator()
+    batch = []
+    for line in lines:
+        if not line.qty:
+            continue
+        batch.append(OrderProduct(
+            order_id=carts[line.cart_id],
+            product_id=line.product_id,
+            title=line.product.title,
+            price=(line.final_price / line.qty).quantize(Decimal('0.01')),
+            qty=line.qty,
+            final_price=line.final_price
+        ))
+        if len(batch) >= 1000:
+            OrderProduct.objects.bulk_create(batch)
+            batch = []
+    OrderProduct.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mainapp', '0006_product_image_hash'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrderProduct',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('title', models.CharField(max_length=255, verbose_name='наименование')),
+                ('price', models.DecimalField(decimal_places=2, max_digits=9, verbose_name='цена')),
+                ('qty', models.PositiveIntegerField(default=1)),
+                ('final_price', models.DecimalField(decimal_places=2, max_digits=9, verbose_name='общая цена')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='idempotency_key',
+            field=models.CharField(blank=True, editable=False, max_length=64, null=True, verbose_name='ключ идемпотентности'),
+        ),
+        migrations.AddConstraint(
+            model_name='order',
+            constraint=models.UniqueConstraint(fields=('customer', 'idempotency_key'), name='order_idempotency_key_uniq'),
+        ),
+        migrations.AddField(
+            model_name='orderproduct',
+            name='order',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lines', to='mainapp.order', verbose_name='заказ'),
+        ),
+        migrations.AddField(
+            model_name='orderproduct',
+            name='product',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, to='mainapp.product', verbose_name='товар'),
+        ),
+        migrations.RunPython(
+            snapshot_order_lines, migrations.RunPython.noop
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 3.1.2 on 2026-10-18 04:31
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mainapp', '0007_order_lines_idempotency_key'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OutboxEvent',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('topic', models.CharField(max_length=100, verbose_name='тема')),
+                ('payload', models.JSONField(default=dict, verbose_name='данные')),
+                ('status', models.CharField(choices=[('pending', 'ожидает обработки'), ('done', 'обработано'), ('failed', 'ошибка')], default='pending', max_length=20, verbose_name='статус')),
+                ('attempts', models.PositiveIntegerField(default=0, verbose_name='попытки')),
+                ('available_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='доступно с')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='дата создания')),
+                ('processed_at', models.DateTimeField(blank=True, null=True, verbose_name='дата обработки')),
+                ('last_error', models.TextField(blank=True, verbose_name='последняя ошибка')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='outboxevent',
+            index=models.Index(fields=['status', 'available_at'], name='outbox_status_available_idx'),
+        ),
+    ]
@@ -0,0 +1,92 @@
+from django.db import migrations
+from django.db.models import Count, Sum
+
+# A frozen copy of mainapp.dedupe as of this migration, so that later
+# changes to the app code cannot change what the migration does.
+
+
+def recalc_totals(Cart, CartProduct, cart_id):
+    totals = CartProduct.objects.filter(cart_id=cart_id).aggregate(
+        final_price=Sum('final_price'), total_products=Count('id')
+        )
+    Cart.objects.filter(pk=cart_id).update(
+        final_price=totals['final_price'] or 0,
+        total_products=totals['total_products']
+        )
+
+
+def merge_duplicate_lines(Cart, CartProduct):
+    duplicates = CartProduct.objects.values('cart_id', 'product_id').annotate(
+        n=Count('id')
+        ).filter(n__gt=1).order_by()
+    for row in list(duplicates):
+        lines = list(CartProduct.objects.filter(
+            cart_id=row['cart_id'], product_id=row['product_id']
+            ).order_by('id'))
+        keep, extra = lines[0], lines[1:]
+        CartProduct.objects.filter(pk=keep.pk).update(
+            qty=sum(line.qty for line in lines),
+            final_price=sum(line.final_price for line in lines)
+            )
+        CartProduct.objects.filter(pk__in=[line.pk for line in extra]).delete()
+        recalc_totals(Cart, CartProduct, keep.cart_id)
+
+
+def merge_duplicate_open_carts(Cart, CartProduct, Order):
+    through = Cart.products.through
+    duplicates = Cart.objects.filter(
+        in_order=False, owner__isnull=False
+        ).values('owner_id').annotate(n=Count('id')).filter(n__gt=1).order_by()
+    for row in list(duplicates):
+        carts = list(Cart.objects.filter(
+            owner_id=row['owner_id'], in_order=False
+            ).order_by('-id').values_list('id', flat=True))
+        keep, extra = carts[0], carts[1:]
+        existing = {
+            line.product_id: line
+            for line in CartProduct.objects.filter(cart_id=keep)
+        }
+        grown, moved = [], []
+        for line in CartProduct.objects.filter(cart_id__in=extra):
+            target = existing.get(line.product_id)
+            if target is None:
+                line.cart_id = keep
+                existing[line.product_id] = line
+                moved.append(line)
+            else:
+                target.qty += line.qty
+                target.final_price += line.final_price
+                grown.append(target)
+        CartProduct.objects.bulk_update(grown, ['qty', 'final_price'])
+        CartProduct.objects.bulk_update(moved, ['cart'])
+        through.objects.filter(
+            cartproduct_id__in=[line.id for line in moved]
+            ).delete()
+        through.objects.bulk_create([
+            through(cart_id=keep, cartproduct_id=line.id) for line in moved
+        ])
+        ordered = set(Order.objects.filter(cart_id__in=extra).values_list(
+            'cart_id', flat=True
+            ))
+        Cart.objects.filter(id__in=ordered).update(in_order=True)
+        Cart.objects.filter(id__in=set(extra) - ordered).delete()
+        recalc_totals(Cart, CartProduct, keep)
+
+
+def dedupe(apps, schema_editor):
+    Cart = apps.get_model('mainapp', 'Cart')
+    CartProduct = apps.get_model('mainapp', 'CartProduct')
+    Order = apps.get_model('mainapp', 'Order')
+    merge_duplicate_lines(Cart, CartProduct)
+    merge_duplicate_open_carts(Cart, CartProduct, Order)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mainapp', '0008_outboxevent'),
+    ]
+
+    operations = [
+        migrations.RunPython(dedupe, migrations.RunPython.noop),
+    ]
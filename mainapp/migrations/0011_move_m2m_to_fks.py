@@ -0,0 +1,59 @@
+from django.db import migrations
+from django.db.models import F
+
+
+def move_to_fks(apps, schema_editor):
+    Cart = apps.get_model('mainapp', 'Cart')
+    CartProduct = apps.get_model('mainapp', 'CartProduct')
+    Customer = apps.get_model('mainapp', 'Customer')
+    Order = apps.get_model('mainapp', 'Order')
+
+    # Links that disagree with the foreign key are the only ones that carry
+    # information; everything else is already mirrored by the FK.
+    through = Customer.orders.through
+    for order_id, customer_id in through.objects.exclude(
+            order__customer_id=F('customer_id')
+            ).values_list('order_id', 'customer_id'):
+        Order.objects.filter(pk=order_id).update(customer_id=customer_id)
+
+    through = Cart.products.through
+    for line_id, cart_id in through.objects.exclude(
+            cartproduct__cart_id=F('cart_id')
+            ).values_list('cartproduct_id', 'cart_id'):
+        line = CartProduct.objects.get(pk=line_id)
+        if not CartProduct.objects.filter(
+                cart_id=cart_id, product_id=line.product_id).exists():
+            CartProduct.objects.filter(pk=line_id).update(cart_id=cart_id)
+
+
+def copy_from_fks(apps, schema_editor):
+    Cart = apps.get_model('mainapp', 'Cart')
+    CartProduct = apps.get_model('mainapp', 'CartProduct')
+    Customer = apps.get_model('mainapp', 'Customer')
+    Order = apps.get_model('mainapp', 'Order')
+
+    through = Customer.orders.through
+    through.objects.bulk_create(
+        (through(customer_id=customer_id, order_id=order_id)
+         for order_id, customer_id in Order.objects.values_list(
+             'id', 'customer_id').iterator()),
+        batch_size=1000
+    )
+    through = Cart.products.through
+    through.objects.bulk_create(
+        (through(cart_id=cart_id, cartproduct_id=line_id)
+         for line_id, cart_id in CartProduct.objects.values_list(
+             'id', 'cart_id').iterator()),
+        batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mainapp', '0010_cart_order_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(move_to_fks, copy_from_fks),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 3.1.2 on 2026-10-18 04:42
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mainapp', '0011_move_m2m_to_fks'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='cart',
+            name='products',
+        ),
+        migrations.RemoveField(
+            model_name='customer',
+            name='orders',
+        ),
+    ]
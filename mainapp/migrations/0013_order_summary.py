@@ -0,0 +1,88 @@
+# Generated by Django 3.1.2 on 2026-10-18 04:44
+
+from collections import defaultdict
+
+from decimal import Decimal
+
+from django.db import migrations, models
+
+BATCH_SIZE = 1000
+ORDER_SUMMARY_ITEMS = 3
+
+
+def summarize_order_lines(lines):
+    # A frozen copy of mainapp.utils.summarize_order_lines.
+    total_products = 0
+    final_price = Decimal(0)
+    summary = []
+    for title, image, image_hash, qty, line_price in lines:
+        total_products += 1
+        final_price += line_price
+        if len(summary) < ORDER_SUMMARY_ITEMS:
+            summary.append({
+                'title': title,
+                'qty': qty,
+                'image': image or '',
+                'image_hash': image_hash or '',
+            })
+    return {
+        'total_products': total_products,
+        'final_price': final_price,
+        'summary': summary,
+    }
+
+
+def backfill_summaries(apps, schema_editor):
+    Order = apps.get_model('mainapp', 'Order')
+    OrderProduct = apps.get_model('mainapp', 'OrderProduct')
+    last_id = 0
+    while True:
+        ids = list(Order.objects.filter(id__gt=last_id).order_by('id')
+                   .values_list('id', flat=True)[:BATCH_SIZE])
+        if not ids:
+            return
+        lines = defaultdict(list)
+        for order_id, *line in OrderProduct.objects.filter(
+                order_id__in=ids).order_by('id').values_list(
+                'order_id', 'title', 'product__image', 'product__image_hash',
+                'qty', 'final_price'):
+            lines[order_id].append(line)
+        Order.objects.bulk_update(
+            [Order(id=pk, **summarize_order_lines(lines[pk])) for pk in ids],
+            ['total_products', 'final_price', 'summary']
+        )
+        last_id = ids[-1]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mainapp', '0012_remove_cart_products_customer_orders'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='order',
+            name='order_customer_created_idx',
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='final_price',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=9, verbose_name='общая цена'),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='summary',
+            field=models.JSONField(blank=True, default=list, editable=False, verbose_name='краткое содержание'),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='total_products',
+            field=models.PositiveIntegerField(default=0, verbose_name='количество товаров'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['customer', '-created_at', '-id'], name='order_customer_created_idx'),
+        ),
+        migrations.RunPython(backfill_summaries, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,60 @@
+# Generated by Django 3.1.2 on 2026-10-18 04:48
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mainapp', '0013_order_summary'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyCategorySales',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(verbose_name='день')),
+                ('buying_type', models.CharField(choices=[('self', 'самовывоз'), ('delivery', 'доставка')], max_length=100, verbose_name='тип заказа')),
+                ('status', models.CharField(choices=[('new', 'новый заказ'), ('in_progress', 'заказ в обработке'), ('is_ready', 'заказ готов'), ('completed', 'заказ выполнен')], max_length=100, verbose_name='статус заказа')),
+                ('orders', models.IntegerField(default=0, verbose_name='заказов')),
+                ('items', models.IntegerField(default=0, verbose_name='единиц товара')),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='выручка')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='DailySales',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(verbose_name='день')),
+                ('buying_type', models.CharField(choices=[('self', 'самовывоз'), ('delivery', 'доставка')], max_length=100, verbose_name='тип заказа')),
+                ('status', models.CharField(choices=[('new', 'новый заказ'), ('in_progress', 'заказ в обработке'), ('is_ready', 'заказ готов'), ('completed', 'заказ выполнен')], max_length=100, verbose_name='статус заказа')),
+                ('orders', models.IntegerField(default=0, verbose_name='заказов')),
+                ('items', models.IntegerField(default=0, verbose_name='единиц товара')),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='выручка')),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='order',
+            name='created_at',
+            field=models.DateTimeField(auto_now_add=True, verbose_name='дата создания заказа'),
+        ),
+        migrations.AddConstraint(
+            model_name='dailysales',
+            constraint=models.UniqueConstraint(fields=('day', 'buying_type', 'status'), name='dailysales_key_uniq'),
+        ),
+        migrations.AddField(
+            model_name='dailycategorysales',
+            name='category',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, to='mainapp.category', verbose_name='категория'),
+        ),
+        migrations.AddConstraint(
+            model_name='dailycategorysales',
+            constraint=models.UniqueConstraint(fields=('day', 'category', 'buying_type', 'status'), name='dailycategorysales_key_uniq'),
+        ),
+        migrations.AddConstraint(
+            model_name='dailycategorysales',
+            constraint=models.UniqueConstraint(condition=models.Q(category__isnull=True), fields=('day', 'buying_type', 'status'), name='dailycategorysales_no_category_uniq'),
+        ),
+    ]
@@ -1,21 +1,112 @@
+import hashlib
+from datetime import datetime, timezone
+from functools import lru_cache
+from pathlib import Path
+
+from django.conf import settings
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import condition
 from django.views.generic import View
 
-from .models import Cart, Customer
+from .cart import LazyCart
+from .catalog_cache import catalog_cache
+from .models import Product
+from .pagination import KeysetPaginator
+from .search import get_search_backend
 
 
 class CartMixin(View):
 
     def dispatch(self, request, *args, **kwargs):
-        if request.user.is_authenticated:
-            customer = Customer.objects.filter(user=request.user).first()
-            if not customer:
-                customer = Customer.objects.create(user=request.user)
-            cart = Cart.objects.filter(owner=customer, in_order=False).first()
-            if not cart:
-                cart = Cart.objects.create(owner=customer)
+        self.cart = LazyCart(request)
+        response = super().dispatch(request, *args, **kwargs)
+        if getattr(response, 'is_rendered', True):
+            self.cart.sync_session()
         else:
-            cart = Cart.objects.filter(for_anonymous_user=True).first()
-            if not cart:
-                cart = Cart.objects.create(for_anonymous_user=True)
-        self.cart = cart
-        return super().dispatch(request, *args, **kwargs)
+            response.add_post_render_callback(
+                lambda response: self.cart.sync_session()
+                )
+        return response
+
+
+class ProductPageMixin:
+
+    paginate_by = 12
+
+    def get_sort(self):
+        sort = self.request.GET.get('sort')
+        if sort not in Product.ORDERINGS:
+            sort = 'id'
+        return sort
+
+    def get_filter_query(self):
+        query = self.request.GET.copy()
+        query.pop('sort', None)
+        query.pop('cursor', None)
+        return query.urlencode()
+
+    def get_products_page(self, queryset):
+        sort = self.get_sort()
+        paginator = KeysetPaginator(
+            queryset.only(*Product.CARD_FIELDS),
+            Product.ORDERINGS[sort],
+            self.paginate_by
+            )
+        return paginator.get_page(self.request.GET.get('cursor')), sort
+
+
+class SearchMixin:
+
+    paginate_by = 12
+
+    def get_search_page(self):
+        query = self.request.GET.get('q', '').strip()
+        try:
+            page = max(int(self.request.GET.get('page', 1)), 1)
+        except ValueError:
+            page = 1
+        if not query:
+            return query, page, [], False
+        products = get_search_backend().get_products(
+            query, self.paginate_by + 1, (page - 1) * self.paginate_by
+            )
+        has_next = len(products) > self.paginate_by
+        return query, page, products[:self.paginate_by], has_next
+
+
+BUILD_STARTED = datetime.now(tz=timezone.utc).replace(microsecond=0)
+
+
+@lru_cache(maxsize=None)
+def get_build_version():
+    if settings.BUILD_VERSION:
+        return settings.BUILD_VERSION
+    digest = hashlib.sha1()
+    app_dir = Path(__file__).resolve().parent
+    for path in sorted([*app_dir.rglob('*.py'), *app_dir.rglob('*.html')]):
+        stat = path.stat()
+        digest.update(f'{path}:{stat.st_mtime_ns}:{stat.st_size}'.encode())
+    return digest.hexdigest()[:12]
+
+
+def catalog_etag(request, *args, **kwargs):
+    return f'{catalog_cache.get_version()}-{get_build_version()}'
+
+
+def catalog_last_modified(request, *args, **kwargs):
+    return max(catalog_cache.last_modified(), BUILD_STARTED)
+
+
+class CatalogPageMixin:
+
+    shared_max_age = 60
+
+    def dispatch(self, request, *args, **kwargs):
+        view = condition(
+            etag_func=catalog_etag, last_modified_func=catalog_last_modified
+            )(super().dispatch)
+        response = view(request, *args, **kwargs)
+        patch_cache_control(
+            response, public=True, max_age=0, s_maxage=self.shared_max_age
+            )
+        return response
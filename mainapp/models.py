@@ -1,8 +1,11 @@
 from django.contrib.auth import get_user_model
-from django.db import models
+from django.db import models, transaction
 from django.urls import reverse
 from django.utils import timezone
 
+from .catalog_cache import catalog_cache
+from .images import file_hash
+
 User = get_user_model()
 
 
@@ -20,14 +23,17 @@ class Category(models.Model):
         return reverse('category_detail', kwargs={'slug': self.slug})
 
     def get_fields_for_filter_in_template(self):
-        return ProductFeatures.objects.filter(
-            category=self,
-            use_in_filter=True
-        ).prefetch_related('category').value(
-            'feature_key',
-            'feature_measure',
-            'feature_name',
-            'filter_type'
+        return catalog_cache.get_or_set(
+            f'filter_fields:{self.id}',
+            lambda: list(ProductFeatures.objects.filter(
+                category=self,
+                use_in_filter=True
+            ).values(
+                'feature_key',
+                'filter_measure',
+                'feature_name',
+                'filter_type'
+            ))
         )
 
 
@@ -39,14 +45,46 @@ class Product(models.Model):
     title = models.CharField(max_length=255, verbose_name='наименование')
     slug = models.SlugField(unique=True, verbose_name='артикул')
     image = models.ImageField(verbose_name='изображение')
+    image_hash = models.CharField(
+        max_length=40, blank=True, editable=False, db_index=True,
+        verbose_name='хеш изображения'
+        )
     description = models.TextField(verbose_name='описание', null=True)
     price = models.DecimalField(
         max_digits=9, decimal_places=2, verbose_name='цена'
         )
 
+    CARD_FIELDS = ('id', 'title', 'slug', 'image', 'image_hash', 'price')
+
+    ORDERINGS = {
+        'id': ('id',),
+        'price': ('price', 'id'),
+        '-price': ('-price', '-id'),
+    }
+
     def __str__(self):
         return self.title
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['price', 'id'], name='product_price_id_idx'),
+            models.Index(
+                fields=['category', 'id'], name='product_category_id_idx'
+                ),
+            models.Index(
+                fields=['category', 'price', 'id'],
+                name='product_category_price_idx'
+                ),
+        ]
+
+    def save(self, *args, **kwargs):
+        if self.image and (not self.image_hash or not self.image._committed):
+            try:
+                self.image_hash = file_hash(self.image)
+            except OSError:
+                self.image_hash = ''
+        super().save(*args, **kwargs)
+
     def get_model_name(self):
         return self.__class__.__name__.lower()
 
@@ -95,8 +133,7 @@ class ProductFeatures(models.Model):
 
     def __str__(self):
         return f'Категория - "{self.category.name}" | ' \
-            f'Характеристика - "{self.feature_name}" | ' \
-            f'Значение = "{self.feature_value}"'
+            f'Характеристика - "{self.feature_name}"'
 
 
 class ProductFeatureValidators(models.Model):
@@ -121,6 +158,33 @@ class ProductFeatureValidators(models.Model):
                 f'Характеристика - "{self.feature.feature_name}"'
 
 
+class ProductFeatureValues(models.Model):
+
+    product = models.ForeignKey(
+        Product, verbose_name='товар', related_name='feature_values',
+        on_delete=models.CASCADE
+        )
+    feature = models.ForeignKey(
+        ProductFeatures, verbose_name='характеристика',
+        on_delete=models.CASCADE
+        )
+    value = models.CharField(
+        max_length=255, verbose_name='значение характеристики'
+        )
+
+    def __str__(self):
+        return f'Товар "{self.product.title}" | ' \
+            f'Характеристика "{self.feature.feature_name}" = "{self.value}"'
+
+    class Meta:
+        unique_together = ('product', 'feature', 'value')
+        indexes = [
+            models.Index(
+                fields=['feature', 'value'], name='feature_value_idx'
+                ),
+        ]
+
+
 class CartProduct(models.Model):
     user = models.ForeignKey(
         'Customer', verbose_name='покупатель', on_delete=models.CASCADE
@@ -144,15 +208,19 @@ class CartProduct(models.Model):
         self.final_price = self.qty * self.product.price
         super().save(*args, **kwargs)
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['cart', 'product'], name='cartproduct_cart_product_uniq'
+                ),
+        ]
+
 
 class Cart(models.Model):
     owner = models.ForeignKey(
         'Customer', null=True, verbose_name='владелец',
         on_delete=models.CASCADE
         )
-    products = models.ManyToManyField(
-        CartProduct, blank=True, related_name='related_cart'
-        )
     total_products = models.PositiveIntegerField(default=0, null=True)
     final_price = models.DecimalField(
         max_digits=9, default=0, decimal_places=2, verbose_name='общая цена'
@@ -163,6 +231,18 @@ class Cart(models.Model):
     def __str__(self):
         return str(self.id)
 
+    @property
+    def products(self):
+        return self.related_products
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['owner'], condition=models.Q(in_order=False),
+                name='cart_one_open_per_customer'
+                ),
+        ]
+
 
 class Customer(models.Model):
     user = models.ForeignKey(
@@ -174,14 +254,14 @@ class Customer(models.Model):
     address = models.CharField(
         max_length=255, verbose_name='адрес', null=True, blank=True
         )
-    orders = models.ManyToManyField(
-        'Order', verbose_name='Заказы покупателя',
-        related_name='related_customer'
-        )
 
     def __str__(self):
         return f"Покупатель: {self.user.first_name} {self.user.last_name}"
 
+    @property
+    def orders(self):
+        return self.related_orders
+
 
 class Order(models.Model):
 
@@ -231,11 +311,181 @@ class Order(models.Model):
         verbose_name='комментарий к заказу', null=True, blank=True
         )
     created_at = models.DateTimeField(
-        auto_now=True, verbose_name='дата создания заказа'
+        auto_now_add=True, verbose_name='дата создания заказа'
         )
     order_date = models.DateField(
         verbose_name='дата получения заказа', default=timezone.now
         )
+    idempotency_key = models.CharField(
+        max_length=64, null=True, blank=True, editable=False,
+        verbose_name='ключ идемпотентности'
+        )
+    total_products = models.PositiveIntegerField(
+        default=0, verbose_name='количество товаров'
+        )
+    final_price = models.DecimalField(
+        max_digits=9, default=0, decimal_places=2, verbose_name='общая цена'
+        )
+    summary = models.JSONField(
+        default=list, blank=True, editable=False,
+        verbose_name='краткое содержание'
+        )
 
     def __str__(self):
         return str(self.id)
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        if self.pk is None or (
+                update_fields is not None and
+                not {'status', 'buying_type'} & set(update_fields)):
+            super().save(*args, **kwargs)
+            return
+        from .rollups import move_order
+        # Lock the row so concurrent edits move the order between sales
+        # rollup buckets one at a time, and roll back with a failed save.
+        with transaction.atomic():
+            old = Order.objects.select_for_update().filter(
+                pk=self.pk
+                ).values_list('status', 'buying_type').first()
+            super().save(*args, **kwargs)
+            if old is not None and old != (self.status, self.buying_type):
+                move_order(self, *old)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['customer', 'idempotency_key'],
+                name='order_idempotency_key_uniq'
+                ),
+        ]
+        indexes = [
+            models.Index(
+                fields=['customer', '-created_at', '-id'],
+                name='order_customer_created_idx'
+                ),
+            models.Index(fields=['status', '-id'], name='order_status_id_idx'),
+            models.Index(fields=['created_at'], name='order_created_idx'),
+        ]
+
+
+class OrderProduct(models.Model):
+    order = models.ForeignKey(
+        Order, verbose_name='заказ', on_delete=models.CASCADE,
+        related_name='lines'
+        )
+    product = models.ForeignKey(
+        Product, verbose_name='товар', on_delete=models.SET_NULL, null=True
+        )
+    title = models.CharField(max_length=255, verbose_name='наименование')
+    price = models.DecimalField(
+        max_digits=9, decimal_places=2, verbose_name='цена'
+        )
+    qty = models.PositiveIntegerField(default=1)
+    final_price = models.DecimalField(
+        max_digits=9, decimal_places=2, verbose_name='общая цена'
+        )
+
+    def __str__(self):
+        return f"Продукт: {self.title} (для заказа {self.order_id})"
+
+
+class OutboxEvent(models.Model):
+
+    STATUS_PENDING = 'pending'
+    STATUS_DONE = 'done'
+    STATUS_FAILED = 'failed'
+
+    STATUS_CHOICES = (
+        (STATUS_PENDING, 'ожидает обработки'),
+        (STATUS_DONE, 'обработано'),
+        (STATUS_FAILED, 'ошибка'),
+    )
+
+    topic = models.CharField(max_length=100, verbose_name='тема')
+    payload = models.JSONField(default=dict, verbose_name='данные')
+    status = models.CharField(
+        max_length=20, choices=STATUS_CHOICES, default=STATUS_PENDING,
+        verbose_name='статус'
+        )
+    attempts = models.PositiveIntegerField(default=0, verbose_name='попытки')
+    available_at = models.DateTimeField(
+        default=timezone.now, verbose_name='доступно с'
+        )
+    created_at = models.DateTimeField(
+        auto_now_add=True, verbose_name='дата создания'
+        )
+    processed_at = models.DateTimeField(
+        null=True, blank=True, verbose_name='дата обработки'
+        )
+    last_error = models.TextField(blank=True, verbose_name='последняя ошибка')
+
+    def __str__(self):
+        return f'{self.topic} #{self.id}'
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['status', 'available_at'],
+                name='outbox_status_available_idx'
+                ),
+        ]
+
+
+class SalesRollup(models.Model):
+    day = models.DateField(verbose_name='день')
+    buying_type = models.CharField(
+        max_length=100, choices=Order.BUYING_TYPE_CHOICES,
+        verbose_name='тип заказа'
+        )
+    status = models.CharField(
+        max_length=100, choices=Order.STATUS_CHOICES,
+        verbose_name='статус заказа'
+        )
+    orders = models.IntegerField(default=0, verbose_name='заказов')
+    items = models.IntegerField(default=0, verbose_name='единиц товара')
+    revenue = models.DecimalField(
+        max_digits=14, decimal_places=2, default=0, verbose_name='выручка'
+        )
+
+    class Meta:
+        abstract = True
+
+
+class DailySales(SalesRollup):
+
+    def __str__(self):
+        return f'{self.day} {self.buying_type} {self.status}'
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['day', 'buying_type', 'status'],
+                name='dailysales_key_uniq'
+                ),
+        ]
+
+
+class DailyCategorySales(SalesRollup):
+    # orders counts orders with at least one line in the category, so it does
+    # not add up across categories; DailySales holds the exact order totals.
+    category = models.ForeignKey(
+        Category, verbose_name='категория', on_delete=models.CASCADE,
+        null=True
+        )
+
+    def __str__(self):
+        return f'{self.day} {self.category_id} {self.buying_type} {self.status}'
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['day', 'category', 'buying_type', 'status'],
+                name='dailycategorysales_key_uniq'
+                ),
+            models.UniqueConstraint(
+                fields=['day', 'buying_type', 'status'],
+                condition=models.Q(category__isnull=True),
+                name='dailycategorysales_no_category_uniq'
+                ),
+        ]
@@ -0,0 +1,91 @@
+from datetime import timedelta
+
+from django.db import close_old_connections, connection, transaction
+from django.utils import timezone
+
+from .db.routers import use_primary
+from .models import OutboxEvent
+
+HANDLERS = {}
+
+LEASE = timedelta(minutes=5)
+BACKOFF_BASE = 5
+BACKOFF_MAX = 3600
+MAX_ATTEMPTS = 10
+
+
+def handler(topic):
+    def register(func):
+        HANDLERS.setdefault(topic, []).append(func)
+        return func
+    return register
+
+
+def publish(topic, payload):
+    return OutboxEvent.objects.create(topic=topic, payload=payload)
+
+
+def backoff(attempts):
+    return timedelta(seconds=min(BACKOFF_BASE * 2 ** (attempts - 1), BACKOFF_MAX))
+
+
+def claim_events(batch_size):
+    now = timezone.now()
+    skip_locked = connection.features.has_select_for_update_skip_locked
+    with transaction.atomic():
+        events = list(
+            OutboxEvent.objects.select_for_update(skip_locked=skip_locked)
+            .filter(
+                status=OutboxEvent.STATUS_PENDING, available_at__lte=now
+                )
+            .order_by('available_at', 'id')[:batch_size]
+        )
+        if events:
+            OutboxEvent.objects.filter(
+                id__in=[event.id for event in events]
+                ).update(available_at=now + LEASE)
+    return events
+
+
+def dispatch(event):
+    try:
+        with use_primary():
+            for func in HANDLERS.get(event.topic, ()):
+                func(event.payload)
+    finally:
+        close_old_connections()
+
+
+def complete_events(events):
+    OutboxEvent.objects.filter(id__in=[event.id for event in events]).update(
+        status=OutboxEvent.STATUS_DONE, processed_at=timezone.now()
+        )
+
+
+def fail_event(event, error):
+    attempts = event.attempts + 1
+    OutboxEvent.objects.filter(id=event.id).update(
+        attempts=attempts,
+        status=OutboxEvent.STATUS_FAILED if attempts >= MAX_ATTEMPTS
+        else OutboxEvent.STATUS_PENDING,
+        available_at=timezone.now() + backoff(attempts),
+        last_error=repr(error)
+        )
+
+
+def process_batch(executor, batch_size):
+    events = claim_events(batch_size)
+    futures = [(event, executor.submit(dispatch, event)) for event in events]
+    done = []
+    failed = []
+    for event, future in futures:
+        try:
+            future.result()
+        except Exception as e:
+            fail_event(event, e)
+            failed.append((event, e))
+        else:
+            done.append(event)
+    if done:
+        complete_events(done)
+    return done, failed
@@ -0,0 +1,118 @@
+import base64
+import binascii
+import json
+
+from django.core.exceptions import ValidationError
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Q
+from django.utils.functional import cached_property
+
+
+class KeysetPage:
+
+    def __init__(self, object_list, next_cursor):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+
+class KeysetPaginator:
+
+    def __init__(self, queryset, ordering, per_page):
+        self.queryset = queryset
+        self.ordering = ordering
+        self.per_page = per_page
+
+    @staticmethod
+    def _field(name):
+        return name.lstrip('-'), name.startswith('-')
+
+    def encode_cursor(self, obj):
+        values = [
+            str(getattr(obj, self._field(name)[0])) for name in self.ordering
+        ]
+        return base64.urlsafe_b64encode(
+            json.dumps(values, separators=(',', ':')).encode()
+            ).decode().rstrip('=')
+
+    def decode_cursor(self, cursor):
+        try:
+            values = json.loads(
+                base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+                )
+        except (binascii.Error, ValueError):
+            return None
+        if (not isinstance(values, list) or
+                len(values) != len(self.ordering) or
+                not all(isinstance(value, str) for value in values)):
+            return None
+        return values
+
+    def get_filter(self, values):
+        condition = Q()
+        equal = {}
+        for name, value in zip(self.ordering, values):
+            field, descending = self._field(name)
+            lookup = f'{field}__lt' if descending else f'{field}__gt'
+            condition |= Q(**equal, **{lookup: value})
+            equal[field] = value
+        return condition
+
+    def get_page(self, cursor=None):
+        queryset = self.queryset.order_by(*self.ordering)
+        values = self.decode_cursor(cursor) if cursor else None
+        if values:
+            try:
+                queryset = queryset.filter(self.get_filter(values))
+            except (ValidationError, ValueError):
+                pass
+        object_list = list(queryset[:self.per_page + 1])
+        next_cursor = None
+        if len(object_list) > self.per_page:
+            object_list = object_list[:self.per_page]
+            next_cursor = self.encode_cursor(object_list[-1])
+        return KeysetPage(object_list, next_cursor)
+
+
+class EstimatedCountPaginator(Paginator):
+    """Paginator for large admin changelists that avoids exact COUNT(*).
+
+    An unfiltered PostgreSQL table is counted from the planner statistics;
+    filtered querysets are counted up to count_limit rows and report that
+    limit when there are more.
+    """
+
+    count_limit = 10000
+
+    def estimate_count(self):
+        queryset = self.object_list
+        connection = connections[queryset.db]
+        if connection.vendor != 'postgresql' or queryset.query.where:
+            return None
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass',
+                [connection.ops.quote_name(queryset.model._meta.db_table)]
+                )
+            row = cursor.fetchone()
+        # reltuples is -1 (0 before PostgreSQL 14) until the first ANALYZE
+        if row and row[0] > self.count_limit:
+            return row[0]
+        return None
+
+    @cached_property
+    def count(self):
+        estimate = self.estimate_count()
+        if estimate is not None:
+            return estimate
+        return self.object_list[:self.count_limit].count()
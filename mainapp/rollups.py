@@ -0,0 +1,161 @@
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .catalog_cache import get_categories
+from .models import DailyCategorySales, DailySales, Order, OrderProduct
+
+REPORT_GROUPS = {
+    'day': (DailySales, 'day'),
+    'buying_type': (DailySales, 'buying_type'),
+    'status': (DailySales, 'status'),
+    'category': (DailyCategorySales, 'category_id'),
+}
+
+
+def apply_delta(model, key, orders, items, revenue):
+    values = {
+        'orders': F('orders') + orders,
+        'items': F('items') + items,
+        'revenue': F('revenue') + revenue,
+    }
+    if model.objects.filter(**key).update(**values):
+        return
+    try:
+        with transaction.atomic():
+            model.objects.create(
+                **key, orders=orders, items=items, revenue=revenue
+                )
+    except IntegrityError:
+        # Another transaction created the row after our update missed it.
+        model.objects.filter(**key).update(**values)
+
+
+def get_order_lines(order_id):
+    return list(OrderProduct.objects.filter(order_id=order_id).values_list(
+        'product__category_id'
+        ).annotate(items=Sum('qty'), revenue=Sum('final_price')).order_by())
+
+
+def apply_order(order, lines, sign=1, status=None, buying_type=None):
+    key = {
+        'day': timezone.localdate(order.created_at),
+        'buying_type': buying_type or order.buying_type,
+        'status': status or order.status,
+    }
+    total_items = 0
+    total_revenue = Decimal(0)
+    for category_id, items, revenue in lines:
+        apply_delta(
+            DailyCategorySales, dict(key, category_id=category_id),
+            sign, sign * items, sign * revenue
+            )
+        total_items += items
+        total_revenue += revenue
+    apply_delta(DailySales, key, sign, sign * total_items,
+                sign * total_revenue)
+
+
+def record_order(order, sign=1, status=None, buying_type=None):
+    apply_order(order, get_order_lines(order.pk), sign, status, buying_type)
+
+
+def move_order(order, old_status, old_buying_type):
+    lines = get_order_lines(order.pk)
+    apply_order(order, lines, -1, old_status, old_buying_type)
+    apply_order(order, lines)
+
+
+def day_start(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def recompute_days(first_day, last_day):
+    """Rebuild the rollups of first_day..last_day from the orders.
+
+    Unlike the incremental updates this is idempotent, so it is safe to
+    rerun over days that checkout has already recorded.
+    """
+    orders = Order.objects.filter(
+        created_at__gte=day_start(first_day),
+        created_at__lt=day_start(last_day + timedelta(days=1))
+        )
+    DailySales.objects.filter(day__gte=first_day, day__lte=last_day).delete()
+    DailyCategorySales.objects.filter(
+        day__gte=first_day, day__lte=last_day
+        ).delete()
+    DailySales.objects.bulk_create([
+        DailySales(
+            day=row['day'], buying_type=row['buying_type'],
+            status=row['status'], orders=row['orders'],
+            items=row['items'] or 0, revenue=row['revenue'] or 0
+            )
+        for row in orders.values(
+            'buying_type', 'status', day=TruncDate('created_at')
+            ).annotate(
+            orders=Count('id', distinct=True), items=Sum('lines__qty'),
+            revenue=Sum('lines__final_price')
+            ).order_by()
+    ], batch_size=1000)
+    DailyCategorySales.objects.bulk_create([
+        DailyCategorySales(**row)
+        for row in OrderProduct.objects.filter(order__in=orders).values(
+            day=TruncDate('order__created_at'),
+            category_id=F('product__category_id'),
+            buying_type=F('order__buying_type'), status=F('order__status')
+            ).annotate(
+            orders=Count('order_id', distinct=True), items=Sum('qty'),
+            revenue=Sum('final_price')
+            ).order_by()
+    ], batch_size=1000)
+
+
+def rebuild_days(first_day, last_day, attempts=3):
+    for attempt in range(attempts):
+        try:
+            with transaction.atomic():
+                recompute_days(first_day, last_day)
+            return
+        except IntegrityError:
+            # A checkout created a bucket for one of these days after the
+            # delete; its order is committed now, so recomputing picks it up.
+            if attempt == attempts - 1:
+                raise
+
+
+def get_labels(group):
+    if group == 'category':
+        labels = {category.id: category.name for category in get_categories()}
+        labels[None] = 'без категории'
+        return labels
+    if group == 'buying_type':
+        return dict(Order.BUYING_TYPE_CHOICES)
+    if group == 'status':
+        return dict(Order.STATUS_CHOICES)
+    return {}
+
+
+def get_sales_report(group, date_from=None, date_to=None):
+    model, field = REPORT_GROUPS[group]
+    queryset = model.objects.all()
+    if date_from:
+        queryset = queryset.filter(day__gte=date_from)
+    if date_to:
+        queryset = queryset.filter(day__lte=date_to)
+    labels = get_labels(group)
+    return [
+        {
+            'key': row[field],
+            'label': labels.get(row[field], row[field]),
+            'orders': row['orders'],
+            'items': row['items'],
+            'revenue': row['revenue'],
+        }
+        for row in queryset.values(field).annotate(
+            orders=Sum('orders'), items=Sum('items'), revenue=Sum('revenue')
+            ).order_by(field)
+    ]
@@ -0,0 +1,180 @@
+import re
+from abc import ABC, abstractmethod
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Q
+from django.utils.module_loading import import_string
+
+from .models import Product
+
+SEARCH_CONFIG = 'russian'
+
+
+class SearchBackend(ABC):
+
+    vendor = None
+    # True when the database keeps the index current by itself, so
+    # index_product() has nothing to do.
+    indexed_by_database = False
+
+    @abstractmethod
+    def search(self, query, limit, offset=0):
+        """Return the ids of matching products, best match first."""
+
+    @abstractmethod
+    def rebuild(self, batch_size=10000):
+        """Reindex every product and return how many were indexed."""
+
+    def index_product(self, product):
+        pass
+
+    def index_products(self, products):
+        for product in products:
+            self.index_product(product)
+
+    def remove_product(self, product_id):
+        pass
+
+    def get_products(self, query, limit, offset=0):
+        ids = self.search(query, limit, offset)
+        products = Product.objects.only(*Product.CARD_FIELDS).in_bulk(ids)
+        return [products[pk] for pk in ids if pk in products]
+
+
+class PostgresSearchBackend(SearchBackend):
+
+    vendor = 'postgresql'
+    indexed_by_database = True
+
+    def search(self, query, limit, offset=0):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT id FROM mainapp_product, '
+                'websearch_to_tsquery(%s, %s) AS query '
+                'WHERE search_vector @@ query '
+                'ORDER BY ts_rank_cd(search_vector, query) DESC, id '
+                'LIMIT %s OFFSET %s',
+                [SEARCH_CONFIG, query, limit, offset]
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+    def rebuild(self, batch_size=10000):
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT MIN(id), MAX(id) FROM mainapp_product')
+            min_id, max_id = cursor.fetchone()
+            if min_id is None:
+                return 0
+            updated = 0
+            for start in range(min_id, max_id + 1, batch_size):
+                cursor.execute(
+                    'UPDATE mainapp_product SET search_vector = '
+                    "setweight(to_tsvector(%s, coalesce(title, '')), 'A') || "
+                    "setweight(to_tsvector(%s, coalesce(description, '')), 'B') "
+                    'WHERE id >= %s AND id < %s',
+                    [SEARCH_CONFIG, SEARCH_CONFIG, start, start + batch_size]
+                )
+                updated += cursor.rowcount
+            return updated
+
+
+class SQLiteSearchBackend(SearchBackend):
+
+    vendor = 'sqlite'
+
+    @staticmethod
+    def to_match_query(query):
+        terms = re.findall(r'\w+', query)
+        return ' '.join('"{}"*'.format(term.replace('"', '""')) for term in terms)
+
+    def search(self, query, limit, offset=0):
+        match = self.to_match_query(query)
+        if not match:
+            return []
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT rowid FROM mainapp_product_fts '
+                'WHERE mainapp_product_fts MATCH %s '
+                'ORDER BY bm25(mainapp_product_fts, 10.0, 1.0), rowid '
+                'LIMIT %s OFFSET %s',
+                [match, limit, offset]
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+    def rebuild(self, batch_size=10000):
+        with connection.cursor() as cursor:
+            cursor.execute('DELETE FROM mainapp_product_fts')
+            cursor.execute(
+                'INSERT INTO mainapp_product_fts(rowid, title, description) '
+                'SELECT id, title, description FROM mainapp_product'
+            )
+            return cursor.rowcount
+
+    def index_product(self, product):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'DELETE FROM mainapp_product_fts WHERE rowid = %s',
+                [product.id]
+            )
+            cursor.execute(
+                'INSERT INTO mainapp_product_fts(rowid, title, description) '
+                'VALUES (%s, %s, %s)',
+                [product.id, product.title, product.description]
+            )
+
+    def index_products(self, products):
+        rows = [
+            (product.id, product.title, product.description)
+            for product in products
+        ]
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                'DELETE FROM mainapp_product_fts WHERE rowid = %s',
+                [(row[0],) for row in rows]
+            )
+            cursor.executemany(
+                'INSERT INTO mainapp_product_fts(rowid, title, description) '
+                'VALUES (%s, %s, %s)',
+                rows
+            )
+
+    def remove_product(self, product_id):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'DELETE FROM mainapp_product_fts WHERE rowid = %s',
+                [product_id]
+            )
+
+
+class IContainsSearchBackend(SearchBackend):
+    # Fallback for databases without a full-text backend: no index to keep
+    # up to date, but every search scans the product table.
+
+    indexed_by_database = True
+
+    def search(self, query, limit, offset=0):
+        terms = re.findall(r'\w+', query)
+        if not terms:
+            return []
+        condition = Q()
+        for term in terms:
+            condition &= Q(title__icontains=term) | \
+                Q(description__icontains=term)
+        return list(Product.objects.filter(condition).order_by('id')
+                    .values_list('id', flat=True)[offset:offset + limit])
+
+    def rebuild(self, batch_size=10000):
+        return 0
+
+
+BACKENDS = {
+    backend.vendor: backend
+    for backend in (PostgresSearchBackend, SQLiteSearchBackend)
+}
+
+
+def get_search_backend():
+    path = getattr(settings, 'SEARCH_BACKEND', None)
+    if path:
+        return import_string(path)()
+    return BACKENDS.get(connection.vendor, IContainsSearchBackend)()
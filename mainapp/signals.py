@@ -0,0 +1,82 @@
+from django.contrib.auth.signals import user_logged_in
+from django.db import transaction
+from django.db.models.signals import (post_delete, post_save, pre_delete,
+                                      pre_save)
+from django.dispatch import receiver
+
+from .cart import merge_session_cart
+from .catalog_cache import catalog_cache
+from .db.routers import use_primary
+from .models import (Category, Order, Product, ProductFeatures,
+                     ProductFeatureValues)
+from .rollups import apply_order, get_order_lines
+from .search import get_search_backend
+
+
+@receiver(user_logged_in)
+def merge_anonymous_cart(sender, request, user, **kwargs):
+    merge_session_cart(request, user)
+
+
+def get_category_ids(sender, instance):
+    if sender is Category:
+        return {instance.id}
+    if sender is ProductFeatureValues:
+        with use_primary():
+            return set(Product.objects.filter(
+                pk=instance.product_id
+                ).values_list('category_id', flat=True))
+    return {instance.category_id}
+
+
+@receiver(pre_save, sender=Product)
+@receiver(pre_save, sender=ProductFeatures)
+def remember_old_category(sender, instance, **kwargs):
+    # A product or feature moved to another category changes the facets of
+    # both categories.
+    if instance.pk is None:
+        return
+    # A lagging replica may not have seen the last move yet.
+    with use_primary():
+        instance._old_category_id = sender.objects.filter(
+            pk=instance.pk
+            ).values_list('category_id', flat=True).first()
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_save, sender=Product)
+@receiver(post_save, sender=ProductFeatures)
+@receiver(post_save, sender=ProductFeatureValues)
+@receiver(post_delete, sender=Category)
+@receiver(post_delete, sender=Product)
+@receiver(post_delete, sender=ProductFeatures)
+@receiver(post_delete, sender=ProductFeatureValues)
+def invalidate_catalog_cache(sender, instance, **kwargs):
+    category_ids = get_category_ids(sender, instance)
+    category_ids.add(getattr(instance, '_old_category_id', None))
+    scopes = [
+        f'category:{category_id}' for category_id in category_ids
+        if category_id is not None
+    ]
+    transaction.on_commit(lambda: catalog_cache.invalidate(scopes))
+
+
+@receiver(post_save, sender=Product)
+def index_product(sender, instance, **kwargs):
+    get_search_backend().index_product(instance)
+
+
+@receiver(post_delete, sender=Product)
+def remove_product_from_index(sender, instance, **kwargs):
+    get_search_backend().remove_product(instance.id)
+
+
+@receiver(pre_delete, sender=Order)
+def collect_order_rollup_lines(sender, instance, **kwargs):
+    # The lines are deleted before the order, so read them up front.
+    instance._rollup_lines = get_order_lines(instance.pk)
+
+
+@receiver(post_delete, sender=Order)
+def remove_order_from_rollups(sender, instance, **kwargs):
+    apply_order(instance, getattr(instance, '_rollup_lines', ()), -1)
@@ -0,0 +1,51 @@
+from django import template
+from django.urls import reverse
+
+from ..images import DENSITIES, derivative_filename
+from ..models import Product
+
+register = template.Library()
+
+
+def derivative_url(product, preset, density, fmt):
+    return reverse('product_image', kwargs={
+        'image_hash': product.image_hash,
+        'filename': derivative_filename(preset, density, fmt),
+    })
+
+
+@register.simple_tag
+def product_image_url(product, preset, fmt='jpeg'):
+    if not product.image_hash:
+        return product.image.url
+    return derivative_url(product, preset, 1, fmt)
+
+
+@register.simple_tag
+def product_srcset(product, preset, fmt='jpeg'):
+    if not product.image_hash:
+        return ''
+    return ', '.join(
+        f'{derivative_url(product, preset, density, fmt)} {density}x'
+        for density in DENSITIES
+    )
+
+
+@register.inclusion_tag('product_picture.html')
+def product_picture(product, preset, css_class=''):
+    return {
+        'product': product,
+        'preset': preset,
+        'css_class': css_class,
+    }
+
+
+@register.inclusion_tag('product_picture.html')
+def order_item_picture(item, preset, css_class=''):
+    # Order summaries keep only the image fields, wrap them in an unsaved
+    # product so the usual picture markup applies.
+    product = Product(
+        title=item['title'], image=item['image'],
+        image_hash=item['image_hash']
+        )
+    return product_picture(product, preset, css_class)
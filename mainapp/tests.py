@@ -1,3 +1,806 @@
-from django.test import TestCase
+import asyncio
+import json
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import Future
+from datetime import date, timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser, User
+from django.contrib.sessions.backends.db import SessionStore
+from django.core import mail
+from django.core.management import call_command
+from django.db import (IntegrityError, connection, connections, router,
+                       transaction)
+from django.http import HttpResponse
+from django.test import (RequestFactory, SimpleTestCase, TestCase,
+                         TransactionTestCase, override_settings,
+                         skipUnlessDBFeature)
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from .cart import (ANONYMOUS_CART_SESSION_KEY, SessionCart, add_to_cart,
+                   apply_cart_operations, change_qty, merge_session_cart)
+from .catalog_cache import CatalogCache, catalog_cache
+from .checkout import CheckoutError, place_order
+from .facets import FacetIndex
+from .handlers import notify_managers
+from .db.routers import (PRIMARY_COOKIE, pinned_to_primary,
+                         primary_stickiness_middleware, use_primary,
+                         wrote_to_primary)
+from .models import (Cart, CartProduct, Category, Customer,
+                     DailyCategorySales, DailySales, Order, OrderProduct,
+                     OutboxEvent, Product, ProductFeatures,
+                     ProductFeatureValues)
+from .outbox import (BACKOFF_BASE, LEASE, MAX_ATTEMPTS, claim_events,
+                     process_batch, publish)
+from .pagination import KeysetPaginator
+from .rollups import recompute_days
+from .search import SearchBackend, SQLiteSearchBackend
+
+ORDER_DATA = {
+    'first_name': 'Иван',
+    'last_name': 'Петров',
+    'phone': '+79990000000',
+    'address': 'Москва',
+    'buying_type': Order.BUYING_TYPE_SELF,
+    'order_date': date(2024, 1, 1),
+    'comment': '',
+}
+
+
+def create_products(count, prices=(Decimal('100.00'),)):
+    category = Category.objects.create(name='Категория', slug='category')
+    return [
+        Product.objects.create(
+            category=category, title=f'Товар {n}', slug=f'product-{n}',
+            image='product.jpg', price=prices[n % len(prices)]
+            )
+        for n in range(count)
+    ]
+
+
+def create_customer(username='customer'):
+    return Customer.objects.create(
+        user=User.objects.create_user(username, password='password')
+        )
+
+
+class ConcurrentCartTests(TransactionTestCase):
+
+    @skipUnlessDBFeature('has_select_for_update')
+    def test_concurrent_updates_keep_cart_totals(self):
+        products = create_products(8)
+        cart = Cart.objects.create(owner=create_customer())
+        barrier = threading.Barrier(len(products))
+        errors = []
+
+        def update(product):
+            try:
+                barrier.wait()
+                add_to_cart(Cart.objects.get(pk=cart.pk), product)
+                change_qty(Cart.objects.get(pk=cart.pk), product, 3)
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connection.close()
+
+        threads = [
+            threading.Thread(target=update, args=(product,))
+            for product in products
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        cart.refresh_from_db()
+        self.assertEqual(cart.total_products, len(products))
+        self.assertEqual(cart.final_price, Decimal('300.00') * len(products))
+        self.assertEqual(
+            CartProduct.objects.filter(cart=cart, qty=3).count(),
+            len(products)
+        )
+
+
+class SessionCartMergeTests(TestCase):
+
+    def setUp(self):
+        self.products = create_products(2)
+        self.customer = create_customer()
+        self.cart = Cart.objects.create(owner=self.customer)
+        add_to_cart(self.cart, self.products[0])
+        self.request = RequestFactory().get('/')
+        self.request.session = SessionStore()
+        self.request.user = AnonymousUser()
+        session_cart = SessionCart(self.request.session)
+        for product in self.products:
+            session_cart.add(product)
+        session_cart.set_qty(self.products[1], 2)
+
+    def test_merge_adds_session_items_to_the_customer_cart(self):
+        self.request.user = self.customer.user
+        merge_session_cart(self.request, self.customer.user)
+
+        self.cart.refresh_from_db()
+        self.assertEqual(self.cart.total_products, 2)
+        self.assertEqual(self.cart.final_price, Decimal('400.00'))
+        self.assertEqual(dict(self.cart.related_products.values_list(
+            'product_id', 'qty'
+            )), {self.products[0].id: 2, self.products[1].id: 2})
+        self.assertNotIn(ANONYMOUS_CART_SESSION_KEY, self.request.session)
+
+    def test_failed_merge_keeps_the_session_items(self):
+        with mock.patch.object(CartProduct.objects, 'bulk_create',
+                               side_effect=IntegrityError):
+            with self.assertRaises(IntegrityError):
+                merge_session_cart(self.request, self.customer.user)
+
+        self.assertEqual(len(self.request.session[ANONYMOUS_CART_SESSION_KEY]),
+                         2)
+        self.assertEqual(
+            CartProduct.objects.get(cart=self.cart).qty, 1
+        )
+
+
+class CartBatchTests(TestCase):
+
+    def setUp(self):
+        self.products = create_products(2)
+        self.customer = create_customer()
+        self.cart = Cart.objects.create(owner=self.customer)
+        add_to_cart(self.cart, self.products[0])
+        self.client.force_login(self.customer.user)
+
+    def post(self, *operations):
+        return self.client.post(
+            '/api/cart/batch/', {'operations': list(operations)},
+            content_type='application/json'
+            )
+
+    def test_add_with_qty_increases_an_existing_line(self):
+        response = self.post(
+            {'op': 'add', 'slug': 'product-0', 'qty': 3},
+            {'op': 'add', 'slug': 'product-1', 'qty': 2},
+            {'op': 'add', 'slug': 'product-1'},
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(dict(self.cart.related_products.values_list(
+            'product_id', 'qty'
+            )), {self.products[0].id: 4, self.products[1].id: 2})
+        self.assertEqual(response.json()['final_price'], '600.00')
+
+    def test_ordered_cart_is_a_conflict(self):
+        with mock.patch('mainapp.cart.lock_cart', return_value=False):
+            response = self.post({'op': 'remove', 'slug': 'product-0'})
+        self.assertEqual(response.status_code, 409)
+        self.assertTrue(self.cart.related_products.exists())
+
+    def test_operations_on_an_ordered_cart_are_refused(self):
+        Cart.objects.filter(pk=self.cart.pk).update(in_order=True)
+        self.assertFalse(apply_cart_operations(
+            self.cart, [{'op': 'remove', 'slug': 'product-0'}],
+            {'product-0': self.products[0]}
+        ))
+        self.assertTrue(self.cart.related_products.exists())
+
+
+class CheckoutIdempotencyTests(TestCase):
+
+    def setUp(self):
+        product, = create_products(1)
+        self.cart = Cart.objects.create(owner=create_customer())
+        add_to_cart(self.cart, product)
+
+    def test_repeated_checkout_returns_the_same_order(self):
+        order, created = place_order(self.cart, ORDER_DATA, 'key-1')
+        self.assertTrue(created)
+
+        cart = Cart.objects.get(pk=self.cart.pk)
+        repeated, created = place_order(cart, ORDER_DATA, 'key-1')
+        self.assertFalse(created)
+        self.assertEqual(repeated.pk, order.pk)
+        self.assertEqual(Order.objects.count(), 1)
+        self.assertEqual(OrderProduct.objects.filter(order=order).count(), 1)
+
+    @override_settings(MANAGERS=[('Менеджер', 'manager@example.com')])
+    def test_manager_email_reports_the_order_total(self):
+        order, _ = place_order(self.cart, ORDER_DATA, 'key-1')
+        # The cart may be recalculated later; the email must not follow it.
+        Cart.objects.filter(pk=self.cart.pk).update(final_price=0)
+        notify_managers({'order_id': order.id})
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertIn('Сумма: 100.00 руб.', mail.outbox[0].body)
+
+    def test_checkout_with_a_new_key_fails_for_an_ordered_cart(self):
+        place_order(self.cart, ORDER_DATA, 'key-1')
+        with self.assertRaises(CheckoutError):
+            place_order(Cart.objects.get(pk=self.cart.pk), ORDER_DATA, 'key-2')
+        self.assertEqual(Order.objects.count(), 1)
+
+
+class KeysetPaginationTests(TestCase):
+
+    def paginate(self, queryset, ordering, per_page):
+        paginator = KeysetPaginator(queryset, ordering, per_page)
+        pages = [paginator.get_page()]
+        while pages[-1].has_next:
+            pages.append(paginator.get_page(pages[-1].next_cursor))
+        return pages
+
+    def test_product_pages_cover_every_product_once(self):
+        create_products(23, prices=(Decimal('10.00'), Decimal('20.00')))
+        for ordering in Product.ORDERINGS.values():
+            with self.subTest(ordering=ordering):
+                pages = self.paginate(Product.objects.all(), ordering, 5)
+                ids = [product.id for page in pages for product in page]
+                self.assertEqual(ids, list(
+                    Product.objects.order_by(*ordering)
+                    .values_list('id', flat=True)
+                ))
+                self.assertEqual([len(page) for page in pages],
+                                 [5, 5, 5, 5, 3])
+
+    def test_order_history_pages_break_ties_by_id(self):
+        customer = create_customer()
+        Order.objects.bulk_create([
+            Order(customer=customer, **ORDER_DATA) for _ in range(7)
+        ])
+        # Orders placed in the same instant are ordered by id alone.
+        Order.objects.update(created_at=timezone.now())
+        pages = self.paginate(
+            Order.objects.filter(customer=customer), ('-created_at', '-id'), 3
+            )
+        ids = [order.id for page in pages for order in page]
+        self.assertEqual(ids, sorted(ids, reverse=True))
+        self.assertEqual(len(ids), 7)
+
+    def test_invalid_cursor_returns_the_first_page(self):
+        create_products(3)
+        paginator = KeysetPaginator(Product.objects.all(), ('id',), 2)
+        first = [product.id for product in paginator.get_page()]
+        for cursor in ('garbage', 'WyJ4Il0', 'WzFd'):
+            with self.subTest(cursor=cursor):
+                self.assertEqual(
+                    [product.id for product in paginator.get_page(cursor)],
+                    first
+                )
+
+
+class FacetIndexTests(TestCase):
+
+    def setUp(self):
+        self.products = create_products(
+            12, prices=(Decimal('30.00'), Decimal('10.00'), Decimal('20.00'))
+            )
+        category = self.products[0].category
+        color, size = [
+            ProductFeatures.objects.create(
+                feature_key=key, feature_name=key, category=category,
+                use_in_filter=True, filter_type=ProductFeatures.CHECKBOX
+                )
+            for key in ('color', 'size')
+        ]
+        for n, product in enumerate(self.products):
+            ProductFeatureValues.objects.create(
+                product=product, feature=color,
+                value='red' if n % 2 else 'blue'
+                )
+            ProductFeatureValues.objects.create(
+                product=product, feature=size, value='S' if n % 3 else 'M'
+                )
+        self.index = FacetIndex.build(category)
+
+    def ids(self, predicate):
+        return {
+            product.id for n, product in enumerate(self.products)
+            if predicate(n, product)
+        }
+
+    def test_match_intersects_features_and_unions_values(self):
+        self.assertEqual(
+            self.index.match({'color': {'red'}, 'size': {'S'}}),
+            self.ids(lambda n, product: n % 2 and n % 3)
+            )
+        self.assertEqual(
+            self.index.match({'size': {'S', 'M'}}, Decimal('15.00')),
+            self.ids(lambda n, product: product.price >= 15)
+            )
+
+    def test_counts_ignore_the_feature_own_selection(self):
+        counts = self.index.facet_counts({'color': {'red'}})
+        self.assertEqual(counts['color'], {'blue': 6, 'red': 6})
+        self.assertEqual(counts['size'], {'M': 2, 'S': 4})
+
+    def test_cursor_pages_cover_each_filtered_product_once(self):
+        filters = (
+            ({}, None),
+            ({'color': {'red'}}, None),
+            ({'color': {'blue'}, 'size': {'S'}}, Decimal('20.00')),
+        )
+        for sort, ordering in Product.ORDERINGS.items():
+            for selected, price_max in filters:
+                with self.subTest(sort=sort, filters=selected):
+                    ids = self.index.match(selected, price_max=price_max)
+                    pages = [self.index.get_page(ids, sort, None, 2)]
+                    while pages[-1].has_next:
+                        pages.append(self.index.get_page(
+                            ids, sort, pages[-1].next_cursor, 2
+                            ))
+                    self.assertEqual(
+                        [product.id for page in pages for product in page],
+                        list(Product.objects.filter(pk__in=ids)
+                             .order_by(*ordering)
+                             .values_list('id', flat=True))
+                        )
+
+
+@skipUnless(connection.vendor == 'sqlite', 'tests the SQLite FTS5 index')
+class SQLiteSearchTests(TestCase):
+
+    def setUp(self):
+        self.backend = SQLiteSearchBackend()
+        self.in_title, self.in_description, self.other = create_products(3)
+        self.in_title.title = 'Ноутбук игровой'
+        self.in_title.save()
+        self.in_description.description = 'Сумка для ноутбука'
+        self.in_description.save()
+
+    def test_title_matches_rank_first(self):
+        self.assertEqual(
+            self.backend.search('ноутбук', 10),
+            [self.in_title.id, self.in_description.id]
+            )
+        self.assertEqual(self.backend.search('ноутбук', 10, offset=1),
+                         [self.in_description.id])
+
+    def test_save_and_delete_update_the_index(self):
+        self.other.title = 'Ноутбук офисный'
+        self.other.save()
+        self.assertIn(self.other.id, self.backend.search('офисный', 10))
+        self.in_title.delete()
+        self.assertEqual(
+            self.backend.search('ноутбук', 10),
+            [self.other.id, self.in_description.id]
+            )
+
+    def test_rebuild_restores_the_index(self):
+        with connection.cursor() as cursor:
+            cursor.execute('DELETE FROM mainapp_product_fts')
+        self.assertEqual(self.backend.search('ноутбук', 10), [])
+        self.assertEqual(self.backend.rebuild(), 3)
+        self.assertEqual(len(self.backend.search('ноутбук', 10)), 2)
+
+
+class SearchBackendTests(SimpleTestCase):
+
+    def test_backend_must_implement_search_and_rebuild(self):
+        class Incomplete(SearchBackend):
+
+            def search(self, query, limit, offset=0):
+                return []
+
+        with self.assertRaises(TypeError):
+            Incomplete()
+
+
+class CatalogConditionalGetTests(TestCase):
+
+    def setUp(self):
+        self.product, = create_products(1)
+        self.urls = [
+            reverse('base'),
+            self.product.category.get_absolute_url(),
+            self.product.get_absolute_url(),
+        ]
+
+    def test_unchanged_catalog_answers_not_modified(self):
+        for url in self.urls:
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+                response = self.client.get(
+                    url, HTTP_IF_NONE_MATCH=response['ETag']
+                    )
+                self.assertEqual(response.status_code, 304)
+
+    def test_catalog_change_changes_the_etag(self):
+        etag = self.client.get(self.urls[0])['ETag']
+        catalog_cache.invalidate()
+        response = self.client.get(self.urls[0], HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_catalog_pages_do_not_vary_on_cookie(self):
+        self.client.force_login(create_customer().user)
+        for url in self.urls:
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertNotIn('cookie', response.get('Vary', '').lower())
+                self.assertIn('public', response['Cache-Control'])
+
+
+class ImportCatalogTests(TestCase):
+
+    def setUp(self):
+        Category.objects.create(name='Категория', slug='category')
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.dir = tmp.name
+        media = override_settings(MEDIA_ROOT=os.path.join(self.dir, 'media'))
+        media.enable()
+        self.addCleanup(media.disable)
+        with open(os.path.join(self.dir, 'product.jpg'), 'wb') as f:
+            f.write(b'image')
+        self.path = os.path.join(self.dir, 'catalog.jsonl')
+        self.write_rows([
+            {'slug': 'a', 'category': 'category', 'price': '10',
+             'image': 'product.jpg'},
+            '{"slug": "broken"',
+            ['not', 'an', 'object'],
+            {'slug': 'b', 'category': 'unknown', 'price': '20',
+             'image': 'product.jpg'},
+            {'slug': 'c', 'category': 'category', 'price': 'free',
+             'image': 'product.jpg'},
+            {'slug': 'd', 'category': 'category', 'price': '40',
+             'image': 'product.jpg'},
+        ])
+
+    def write_rows(self, rows):
+        with open(self.path, 'w', encoding='utf-8') as f:
+            for row in rows:
+                f.write((row if isinstance(row, str) else json.dumps(row)))
+                f.write('\n')
+
+    def run_import(self, **options):
+        stdout, stderr = StringIO(), StringIO()
+        call_command(
+            'import_catalog', self.path, images_dir=self.dir, batch_size=2,
+            stdout=stdout, stderr=stderr, **options
+            )
+        return stdout.getvalue(), stderr.getvalue()
+
+    def test_bad_rows_are_reported_and_skipped(self):
+        stdout, stderr = self.run_import()
+        self.assertEqual(
+            sorted(Product.objects.values_list('slug', flat=True)),
+            ['a', 'd']
+            )
+        for line_no in (2, 3, 4, 5):
+            self.assertIn(f'Строка {line_no}:', stderr)
+        self.assertIn('Импортировано 2 товаров, пропущено 4 строк',
+                      stdout)
+
+    def test_rerun_from_start_updates_without_duplicates(self):
+        self.run_import()
+        self.write_rows([
+            {'slug': 'a', 'category': 'category', 'price': '15'},
+            {'slug': 'd', 'category': 'category', 'price': '45'},
+            {'slug': 'e', 'category': 'category', 'price': '50',
+             'image': 'product.jpg'},
+        ])
+        self.run_import(start=1)
+        self.run_import(start=1)
+        self.assertEqual(
+            dict(Product.objects.values_list('slug', 'price')),
+            {'a': Decimal('10.00'), 'd': Decimal('45.00'),
+             'e': Decimal('50.00')}
+            )
+        # A row without an image keeps the product's current one.
+        self.assertEqual(
+            Product.objects.get(slug='d').image,
+            Product.objects.get(slug='e').image
+            )
+
+
+class InlineExecutor:
+
+    def submit(self, func, *args):
+        future = Future()
+        try:
+            future.set_result(func(*args))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+
+class OutboxTests(TestCase):
+
+    def setUp(self):
+        self.calls = []
+        self.failures = 0
+        # dispatch() runs in worker threads with their own connections;
+        # inline it must not close the test transaction's connection.
+        for patcher in (
+            mock.patch.dict('mainapp.outbox.HANDLERS',
+                            {'test': [self.handle]}, clear=True),
+            mock.patch('mainapp.outbox.close_old_connections'),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def handle(self, payload):
+        self.calls.append(payload)
+        if self.failures:
+            self.failures -= 1
+            raise RuntimeError('handler failed')
+
+    def later(self, delta):
+        return mock.patch('django.utils.timezone.now',
+                          return_value=timezone.now() + delta)
+
+    def test_claimed_events_are_leased_until_it_expires(self):
+        events = [publish('test', {'n': n}) for n in range(3)]
+        self.assertEqual(claim_events(2), events[:2])
+        self.assertEqual(claim_events(2), events[2:])
+        self.assertEqual(claim_events(2), [])
+        with self.later(LEASE + timedelta(seconds=1)):
+            self.assertEqual(claim_events(5), events)
+
+    def test_failed_event_is_retried_after_a_backoff(self):
+        event = publish('test', {'n': 1})
+        self.failures = 1
+        done, failed = process_batch(InlineExecutor(), 10)
+        self.assertEqual((done, [e for e, _ in failed]), ([], [event]))
+        event.refresh_from_db()
+        self.assertEqual(event.status, OutboxEvent.STATUS_PENDING)
+        self.assertEqual(event.attempts, 1)
+        self.assertIn('handler failed', event.last_error)
+
+        self.assertEqual(process_batch(InlineExecutor(), 10), ([], []))
+        with self.later(timedelta(seconds=BACKOFF_BASE + 1)):
+            done, failed = process_batch(InlineExecutor(), 10)
+        self.assertEqual((done, failed), ([event], []))
+        event.refresh_from_db()
+        self.assertEqual(event.status, OutboxEvent.STATUS_DONE)
+        self.assertEqual(self.calls, [{'n': 1}, {'n': 1}])
+
+    def test_event_fails_for_good_after_max_attempts(self):
+        event = publish('test', {})
+        OutboxEvent.objects.filter(pk=event.pk).update(
+            attempts=MAX_ATTEMPTS - 1
+            )
+        self.failures = 1
+        process_batch(InlineExecutor(), 10)
+        event.refresh_from_db()
+        self.assertEqual(event.status, OutboxEvent.STATUS_FAILED)
+        self.assertEqual(event.attempts, MAX_ATTEMPTS)
+
+
+class OutboxSkipLockedTests(TransactionTestCase):
+
+    @skipUnlessDBFeature('has_select_for_update_skip_locked')
+    def test_claim_skips_events_locked_by_another_worker(self):
+        locked, free = publish('test', {}), publish('test', {})
+        claimed = []
+        with transaction.atomic():
+            OutboxEvent.objects.select_for_update().get(pk=locked.pk)
+
+            def claim():
+                try:
+                    claimed.extend(claim_events(10))
+                finally:
+                    connection.close()
+
+            thread = threading.Thread(target=claim)
+            thread.start()
+            thread.join()
+        self.assertEqual(claimed, [free])
+
+
+class SalesRollupTests(TestCase):
+
+    def setUp(self):
+        self.products = create_products(
+            2, prices=(Decimal('100.00'), Decimal('250.00'))
+            )
+        other = Category.objects.create(name='Другая', slug='other')
+        Product.objects.filter(pk=self.products[1].pk).update(category=other)
+        self.customer = create_customer()
+
+    def place(self, *qtys, **order_data):
+        cart = Cart.objects.create(owner=self.customer)
+        for product, qty in zip(self.products, qtys):
+            if qty:
+                add_to_cart(cart, product)
+                change_qty(cart, product, qty)
+        order, _ = place_order(cart, dict(ORDER_DATA, **order_data))
+        return order
+
+    def snapshot(self):
+        # Incremental updates leave emptied buckets behind; a recompute
+        # drops them.
+        return {
+            model.__name__: sorted(
+                model.objects.exclude(orders=0).values_list(
+                    *(f.attname for f in model._meta.concrete_fields
+                      if f.name != 'id')
+                    )
+                )
+            for model in (DailySales, DailyCategorySales)
+        }
+
+    def assertMatchesRecompute(self):
+        incremental = self.snapshot()
+        today = timezone.localdate()
+        recompute_days(today, today)
+        self.assertEqual(incremental, self.snapshot())
+
+    def test_rollups_follow_created_changed_and_deleted_orders(self):
+        first = self.place(2, 1)
+        second = self.place(0, 3, buying_type=Order.BUYING_TYPE_DELIVERY)
+        self.place(1, 0)
+        self.assertMatchesRecompute()
+        self.assertEqual(
+            DailySales.objects.get(
+                buying_type=Order.BUYING_TYPE_SELF, status=Order.STATUS_NEW
+                ).revenue,
+            Decimal('550.00')
+            )
+
+        first.status = Order.STATUS_COMPLETED
+        first.save()
+        second.buying_type = Order.BUYING_TYPE_SELF
+        second.save(update_fields=['buying_type'])
+        self.assertMatchesRecompute()
+
+        first.delete()
+        self.assertMatchesRecompute()
+        self.assertFalse(DailySales.objects.filter(
+            status=Order.STATUS_COMPLETED
+            ).exclude(orders=0).exists())
+
+
+class RoutingStateMixin:
+    # Writes made by earlier tests in this thread would pin reads to the
+    # primary.
+
+    def setUp(self):
+        super().setUp()
+        tokens = pinned_to_primary.set(False), wrote_to_primary.set(False)
+        self.addCleanup(pinned_to_primary.reset, tokens[0])
+        self.addCleanup(wrote_to_primary.reset, tokens[1])
+
+
+@override_settings(DATABASE_REPLICAS=['replica'])
+class PrimaryReplicaRouterTests(RoutingStateMixin, SimpleTestCase):
+
+    def test_catalog_reads_go_to_the_replica(self):
+        self.assertEqual(Product.objects.all().db, 'replica')
+        self.assertEqual(Order.objects.all().db, 'replica')
+
+    def test_cart_and_account_reads_stay_on_the_primary(self):
+        self.assertEqual(Cart.objects.all().db, 'default')
+        self.assertEqual(Customer.objects.all().db, 'default')
+
+    def test_writes_go_to_the_primary(self):
+        for model in (Product, Category, Cart, Order):
+            with self.subTest(model=model.__name__):
+                self.assertEqual(router.db_for_write(model), 'default')
+
+    def test_sticky_write_pins_later_reads_to_the_primary(self):
+        router.db_for_write(Cart)
+        self.assertEqual(Product.objects.all().db, 'default')
+
+    def test_catalog_write_does_not_pin_reads(self):
+        router.db_for_write(Category)
+        self.assertEqual(Product.objects.all().db, 'replica')
+
+    def test_use_primary(self):
+        with use_primary():
+            self.assertEqual(Product.objects.all().db, 'default')
+        self.assertEqual(Product.objects.all().db, 'replica')
+
+    def get_response(self, cookie=None, view=None):
+        request = RequestFactory().get('/')
+        if cookie is not None:
+            request.COOKIES[PRIMARY_COOKIE] = cookie
+        seen = []
+
+        def get_response(request):
+            if view:
+                view()
+            seen.append(Product.objects.all().db)
+            return HttpResponse()
+
+        response = primary_stickiness_middleware(get_response)(request)
+        return response, seen[0]
+
+    def test_middleware_sets_cookie_after_sticky_write(self):
+        response, _ = self.get_response(
+            view=lambda: router.db_for_write(Cart)
+            )
+        self.assertIn(PRIMARY_COOKIE, response.cookies)
+        response, db = self.get_response()
+        self.assertNotIn(PRIMARY_COOKIE, response.cookies)
+        self.assertEqual(db, 'replica')
+
+    def test_middleware_pins_reads_while_cookie_is_fresh(self):
+        _, db = self.get_response(cookie=str(time.time() + 60))
+        self.assertEqual(db, 'default')
+        for cookie in (str(time.time() - 1), 'garbage'):
+            with self.subTest(cookie=cookie):
+                _, db = self.get_response(cookie=cookie)
+                self.assertEqual(db, 'replica')
+
+    def test_middleware_matches_the_chain_mode(self):
+        async def get_response(request):
+            return HttpResponse()
+
+        middleware = primary_stickiness_middleware(get_response)
+        self.assertTrue(asyncio.iscoroutinefunction(middleware))
+        response = asyncio.run(middleware(RequestFactory().get('/')))
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(asyncio.iscoroutinefunction(
+            primary_stickiness_middleware(lambda request: HttpResponse())
+            ))
+
+
+@skipUnless('replica' in settings.DATABASES,
+            'needs the replica alias from shop.test_settings')
+class ReplicaMirrorTests(RoutingStateMixin, TransactionTestCase):
+
+    databases = '__all__'
+
+    def test_replica_reads_see_primary_writes(self):
+        product, = create_products(1)
+        with CaptureQueriesContext(connections['replica']) as queries:
+            self.assertEqual(Product.objects.get(pk=product.pk), product)
+        self.assertEqual(len(queries), 1)
+
+
+class CatalogCacheInvalidationTests(TransactionTestCase):
+
+    def setUp(self):
+        self.cache = CatalogCache(version_check_interval=0)
+        patcher = mock.patch('mainapp.signals.catalog_cache', self.cache)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.product, = create_products(1)
+        self.other = Category.objects.create(name='Другая', slug='other')
+        self.keys = {
+            'categories': None,
+            'facets': f'category:{self.product.category_id}',
+            'other-facets': f'category:{self.other.pk}',
+        }
+        for key in self.keys:
+            self.recomputed(key)
+
+    def recomputed(self, key):
+        computed = []
+        self.cache.get_or_set(
+            key, lambda: computed.append(key), scope=self.keys[key]
+            )
+        return bool(computed)
+
+    def test_product_save_bumps_the_version_after_commit(self):
+        version = self.cache.get_version()
+        with transaction.atomic():
+            self.product.save()
+            self.assertEqual(self.cache.get_version(), version)
+        self.assertNotEqual(self.cache.get_version(), version)
+        self.assertTrue(self.recomputed('categories'))
+
+    def test_product_save_keeps_other_categories_cached(self):
+        self.product.save()
+        self.assertTrue(self.recomputed('facets'))
+        self.assertFalse(self.recomputed('other-facets'))
+
+    def test_moved_product_invalidates_both_categories(self):
+        self.product.category = self.other
+        self.product.save()
+        self.assertTrue(self.recomputed('facets'))
+        self.assertTrue(self.recomputed('other-facets'))
+
+    def test_full_invalidation_resets_every_scope(self):
+        self.cache.invalidate()
+        for key in self.keys:
+            with self.subTest(key=key):
+                self.assertTrue(self.recomputed(key))
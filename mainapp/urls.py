@@ -1,17 +1,24 @@
 from django.contrib.auth.views import LogoutView
 from django.urls import path
 
+from .async_views import async_view
 from .views import (AddToCartView, BaseView, CartView, CategoryDetailView,
                     ChangeQTYView, CheckoutView, DeleteFromCartView, LoginView,
-                    MakeOrderView, ProductDetailView, ProfileView,
-                    RegistrationView)
+                    MakeOrderView, MetricsView, OrderDetailView,
+                    PersonalNavView, ProductDetailView, ProductImageView,
+                    ProfileView, RegistrationView, SalesDashboardView,
+                    SearchView)
 
 urlpatterns = [
-    path('', BaseView.as_view(), name='base'),
-    path('products/<str:slug>/', ProductDetailView.as_view(),
+    path('', async_view(BaseView.as_view()), name='base'),
+    path('products/<str:slug>/', async_view(ProductDetailView.as_view()),
         name='product_detail'),
-    path('category/<str:slug>/', CategoryDetailView.as_view(),
+    path('category/<str:slug>/', async_view(CategoryDetailView.as_view()),
         name='category_detail'),
+    path('nav/', PersonalNavView.as_view(), name='personal_nav'),
+    path('search/', async_view(SearchView.as_view()), name='search'),
+    path('img/<str:image_hash>/<str:filename>', ProductImageView.as_view(),
+        name='product_image'),
     path('cart/', CartView.as_view(), name='cart'),
     path('add-to-cart/<str:slug>/', AddToCartView.as_view(),
         name='add_to_cart'),
@@ -24,5 +31,10 @@ urlpatterns = [
     path('login/', LoginView.as_view(), name='login'),
     path('logout/', LogoutView.as_view(next_page='/'), name='logout'),
     path('registration/', RegistrationView.as_view(), name='registration'),
-    path('profile/', ProfileView.as_view(), name='profile')
+    path('profile/', ProfileView.as_view(), name='profile'),
+    path('profile/orders/<int:pk>/', OrderDetailView.as_view(),
+        name='order_detail'),
+    path('dashboard/sales/', SalesDashboardView.as_view(),
+        name='sales_dashboard'),
+    path('metrics', MetricsView.as_view(), name='metrics')
     ]
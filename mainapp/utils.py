@@ -1,7 +1,14 @@
+from decimal import Decimal
+from itertools import islice
+
 from django.db import models
+from django.utils.dateparse import parse_date
+
+ORDER_SUMMARY_ITEMS = 3
+
 
 def recalc_cart(cart):
-    cart_data = cart.products.aggregate(
+    cart_data = cart.related_products.aggregate(
         models.Sum('final_price'), models.Count('id')
         )
     if cart_data.get('final_price__sum'):
@@ -10,3 +17,42 @@ def recalc_cart(cart):
         cart.final_price = 0
     cart.total_products = cart_data['id__count']
     cart.save()
+
+
+def summarize_order_lines(lines):
+    # lines: (title, image, image_hash, qty, final_price) in display order
+    total_products = 0
+    final_price = Decimal(0)
+    summary = []
+    for title, image, image_hash, qty, line_price in lines:
+        total_products += 1
+        final_price += line_price
+        if len(summary) < ORDER_SUMMARY_ITEMS:
+            summary.append({
+                'title': title,
+                'qty': qty,
+                'image': image or '',
+                'image_hash': image_hash or '',
+            })
+    return {
+        'total_products': total_products,
+        'final_price': final_price,
+        'summary': summary,
+    }
+
+
+def parse_date_or_none(value):
+    """Parse YYYY-MM-DD, returning None for malformed or impossible dates."""
+    try:
+        return parse_date(value or '')
+    except ValueError:
+        return None
+
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
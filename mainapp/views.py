@@ -1,42 +1,126 @@
+from datetime import timedelta
+from uuid import uuid4
+
 from django.contrib import messages
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.auth import authenticate, login
-from django.db import transaction
-from django.http import HttpResponseRedirect
-from django.shortcuts import render
+from django.core.exceptions import PermissionDenied
+from django.core.files.storage import default_storage
+from django.http import (FileResponse, Http404, HttpResponse,
+                         HttpResponseRedirect, JsonResponse)
+from django.shortcuts import get_object_or_404, render
+from django.template.loader import render_to_string
+from django.utils import timezone
+from django.utils.cache import add_never_cache_headers
+from django.utils.decorators import method_decorator
 from django.views.generic import DetailView, View
 
+from .cart import (add_to_cart, change_qty, get_session_cart_data,
+                   remove_from_cart)
+from .catalog_cache import get_categories
+from .checkout import CheckoutError, place_order
+from .facets import FacetIndex, get_facets, parse_filters
 from .forms import LoginForm, OrderForm, RegistrationForm
-from .mixins import CartMixin
-from .models import CartProduct, Category, Customer, Order, Product
-from .utils import recalc_cart
+from .images import FORMATS, get_or_create_derivative, parse_derivative
+from .metrics import is_scraper_allowed, render_metrics
+from .mixins import (CartMixin, CatalogPageMixin, ProductPageMixin,
+                     SearchMixin)
+from .models import Category, Customer, Order, Product
+from .pagination import KeysetPaginator
+from .rollups import REPORT_GROUPS, get_sales_report
+from .utils import parse_date_or_none
 
 
-class BaseView(CartMixin, View):
+class BaseView(CatalogPageMixin, CartMixin, ProductPageMixin, View):
 
     def get(self, request, *args, **kwargs):
-        categories = Category.objects.all()
-        products = Product.objects.all()
+        categories = get_categories()
+        products, sort = self.get_products_page(Product.objects.all())
 
         return render(request, 'base.html', {
             'categories': categories,
             'products': products,
+            'sort': sort,
+            'deferred_personal': True
+        })
+
+
+class PersonalNavView(CartMixin, View):
+
+    def get(self, request, *args, **kwargs):
+        response = JsonResponse({
+            'nav': render_to_string(
+                'personal_nav.html', {'cart': self.cart}, request
+                ),
+            'messages': render_to_string('messages.html', {}, request),
+        })
+        add_never_cache_headers(response)
+        return response
+
+
+class MetricsView(View):
+
+    def get(self, request, *args, **kwargs):
+        if not is_scraper_allowed(request):
+            raise PermissionDenied
+        response = HttpResponse(
+            render_metrics(),
+            content_type='text/plain; version=0.0.4; charset=utf-8'
+            )
+        add_never_cache_headers(response)
+        return response
+
+
+class SearchView(CartMixin, SearchMixin, View):
+
+    def get(self, request, *args, **kwargs):
+        query, page, products, has_next = self.get_search_page()
+        return render(request, 'search.html', {
+            'categories': get_categories(),
+            'query': query,
+            'page': page,
+            'products': products,
+            'has_next': has_next,
             'cart': self.cart
         })
 
 
-class ProductDetailView(CartMixin, DetailView):
+class ProductImageView(View):
 
+    def get(self, request, *args, **kwargs):
+        image_hash = kwargs.get('image_hash')
+        derivative = parse_derivative(kwargs.get('filename'))
+        source_name = Product.objects.filter(
+            image_hash=image_hash
+            ).values_list('image', flat=True).first()
+        if not derivative or not source_name:
+            raise Http404
+        name = get_or_create_derivative(source_name, image_hash, *derivative)
+        response = FileResponse(
+            default_storage.open(name, 'rb'),
+            content_type=FORMATS[derivative[2]][1]
+            )
+        response['Cache-Control'] = 'public, max-age=31536000, immutable'
+        return response
+
+
+class ProductDetailView(CatalogPageMixin, CartMixin, DetailView):
+
+    model = Product
+    queryset = Product.objects.select_related('category')
     context_object_name = 'product'
     template_name = 'product_detail.html'
     slug_url_kwarg = 'slug'
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['cart'] = self.cart
+        context['categories'] = get_categories()
+        context['deferred_personal'] = True
         return context
 
 
-class CategoryDetailView(CartMixin, DetailView):
+class CategoryDetailView(CatalogPageMixin, CartMixin, ProductPageMixin,
+                         DetailView):
 
     model = Category
     queryset = Category.objects.all()
@@ -46,7 +130,30 @@ class CategoryDetailView(CartMixin, DetailView):
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['cart'] = self.cart
+        index = FacetIndex.for_category(self.object)
+        filters, price_min, price_max = parse_filters(
+            self.object, self.request.GET
+            )
+        if filters or price_min is not None or price_max is not None:
+            sort = self.get_sort()
+            products = index.get_page(
+                index.match(filters, price_min, price_max), sort,
+                self.request.GET.get('cursor'), self.paginate_by
+                )
+        else:
+            products, sort = self.get_products_page(
+                Product.objects.filter(category=self.object)
+                )
+        context['category_products'] = products
+        context['sort'] = sort
+        context['facets'] = get_facets(
+            self.object, index, filters, price_min, price_max
+            )
+        context['price_min'] = price_min
+        context['price_max'] = price_max
+        context['filter_query'] = self.get_filter_query()
+        context['categories'] = get_categories()
+        context['deferred_personal'] = True
         return context
 
 
@@ -55,12 +162,7 @@ class AddToCartView(CartMixin, View):
     def get(self, request, *args, **kwargs):
         product_slug = kwargs.get('slug')
         product = Product.objects.get(slug=product_slug)
-        cart_product, created = CartProduct.objects.get_or_create(
-            user=self.cart.owner, cart=self.cart, product=product
-        )
-        if created:
-            self.cart.products.add(cart_product)
-        recalc_cart(self.cart)
+        add_to_cart(self.cart, product)
         messages.add_message(request, messages.INFO, "Товар успешно добавлен")
         return HttpResponseRedirect('/cart/')
 
@@ -70,12 +172,7 @@ class DeleteFromCartView(CartMixin, View):
     def get(self, request, *args, **kwargs):
         product_slug = kwargs.get('slug')
         product = Product.objects.get(slug=product_slug)
-        cart_product = CartProduct.objects.get(
-            user=self.cart.owner, cart=self.cart, product=product
-        )
-        self.cart.products.remove(cart_product)
-        cart_product.delete()
-        recalc_cart(self.cart)
+        remove_from_cart(self.cart, product)
         messages.add_message(request, messages.INFO, "Товар успешно удален")
         return HttpResponseRedirect('/cart/')
 
@@ -85,13 +182,8 @@ class ChangeQTYView(CartMixin, View):
     def post(self, request, *args, **kwargs):
         product_slug = kwargs.get('slug')
         product = Product.objects.get(slug=product_slug)
-        cart_product = CartProduct.objects.get(
-            user=self.cart.owner, cart=self.cart, product=product
-        )
         qty = int(request.POST.get('qty'))
-        cart_product.qty = qty
-        cart_product.save()
-        recalc_cart(self.cart)
+        change_qty(self.cart, product, qty)
         messages.add_message(
             request, messages.INFO, "Количество успешно изменено")
         return HttpResponseRedirect('/cart/')
@@ -101,7 +193,7 @@ class ChangeQTYView(CartMixin, View):
 class CartView(CartMixin, View):
 
     def get(self, request, *args, **kwargs):
-        categories = Category.objects.all()
+        categories = get_categories()
         return render(request, 'cart.html', {
             'cart': self.cart,
             'categories': categories
@@ -111,8 +203,8 @@ class CartView(CartMixin, View):
 class CheckoutView(CartMixin, View):
 
     def get(self, request, *args, **kwargs):
-        categories = Category.objects.all()
-        form = OrderForm(request.POST or None)
+        categories = get_categories()
+        form = OrderForm(initial={'idempotency_key': uuid4().hex})
         return render(request, 'checkout.html', {
             'cart': self.cart,
             'categories': categories,
@@ -122,26 +214,21 @@ class CheckoutView(CartMixin, View):
 
 class MakeOrderView(CartMixin, View):
 
-    @transaction.atomic
     def post(self, request, *args, **kwargs):
+        if not request.user.is_authenticated:
+            messages.add_message(
+                request, messages.INFO, 'Войдите, чтобы оформить заказ')
+            return HttpResponseRedirect('/login/')
         form = OrderForm(request.POST or None)
-        customer = Customer.objects.get(user=request.user)
         if form.is_valid():
-            new_order = form.save(commit=False)
-            new_order.customer = customer
-            new_order.first_name = form.cleaned_data['first_name']
-            new_order.last_name = form.cleaned_data['last_name']
-            new_order.phone = form.cleaned_data['phone']
-            new_order.address = form.cleaned_data['address']
-            new_order.buying_type = form.cleaned_data['buying_type']
-            new_order.order_date = form.cleaned_data['order_date']
-            new_order.comment = form.cleaned_data['comment']
-            new_order.save()
-            self.cart.in_order = True
-            self.cart.save()
-            new_order.cart = self.cart
-            new_order.save()
-            customer.orders.add(new_order)
+            try:
+                place_order(
+                    self.cart, form.cleaned_data,
+                    form.cleaned_data['idempotency_key']
+                    )
+            except CheckoutError as e:
+                messages.add_message(request, messages.ERROR, str(e))
+                return HttpResponseRedirect('/checkout/')
             messages.add_message(
                 request,
                 messages.INFO,
@@ -155,7 +242,7 @@ class LoginView(CartMixin, View):
 
     def get(self, request, *args, **kwargs):
         form = LoginForm(request.POST or None)
-        categories = Category.objects.all()
+        categories = get_categories()
         return render(request, 'login.html', {
             'form': form,
             'categories': categories,
@@ -181,7 +268,7 @@ class RegistrationView(CartMixin, View):
 
     def get(self, request, *args, **kwargs):
         form = RegistrationForm(request.POST or None)
-        categories = Category.objects.all()
+        categories = get_categories()
         return render(request, 'registration.html', {
             'form': form,
             'categories': categories,
@@ -218,12 +305,68 @@ class RegistrationView(CartMixin, View):
 
 class ProfileView(CartMixin, View):
 
+    paginate_by = 20
+
+    def get_customer_id(self):
+        customer_id = get_session_cart_data(self.request).get('customer_id')
+        if customer_id:
+            return customer_id
+        return Customer.objects.filter(
+            user_id=self.request.user.pk
+            ).values_list('id', flat=True).first()
+
     def get(self, request, *args, **kwargs):
-        customer = Customer.objects.get(user=request.user)
-        orders = Order.objects.filter(customer=customer).order_by('-created_at')
-        categories = Category.objects.all()
+        paginator = KeysetPaginator(
+            Order.objects.filter(customer_id=self.get_customer_id()).only(
+                'id', 'status', 'created_at', 'total_products', 'final_price',
+                'summary'
+                ),
+            ('-created_at', '-id'),
+            self.paginate_by
+            )
+        orders = paginator.get_page(request.GET.get('cursor'))
+        categories = get_categories()
         return render(request, 'profile.html', {
             'orders': orders,
             'cart': self.cart,
             'categories': categories
         })
+
+
+class OrderDetailView(CartMixin, View):
+
+    def get(self, request, *args, **kwargs):
+        order = get_object_or_404(
+            Order.objects.select_related('customer').prefetch_related(
+                'lines__product'
+                ),
+            pk=kwargs.get('pk'), customer__user_id=request.user.pk
+            )
+        return render(request, 'order_detail.html', {
+            'order': order,
+            'cart': self.cart,
+            'categories': get_categories()
+        })
+
+
+@method_decorator(staff_member_required, name='dispatch')
+class SalesDashboardView(View):
+
+    days = 30
+
+    def get_date(self, name, default):
+        return parse_date_or_none(self.request.GET.get(name)) or default
+
+    def get(self, request, *args, **kwargs):
+        today = timezone.localdate()
+        date_to = self.get_date('to', today)
+        date_from = self.get_date('from', date_to - timedelta(days=self.days))
+        reports = {
+            group: get_sales_report(group, date_from, date_to)
+            for group in REPORT_GROUPS
+        }
+        return render(request, 'sales_dashboard.html', {
+            'reports': reports,
+            'date_from': date_from,
+            'date_to': date_to,
+        })
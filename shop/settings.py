@@ -48,7 +48,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'mainapp.metrics.metrics_middleware',
     'django.middleware.security.SecurityMiddleware',
+    'mainapp.db.routers.primary_stickiness_middleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -59,9 +61,13 @@ MIDDLEWARE = [
 
 ROOT_URLCONF = 'shop.urls'
 
+# Under ASGI the catalog and API read views run in the thread pool instead of
+# the single thread Django uses for sync views.
+ASYNC_VIEWS = os.environ.get('SHOP_ASGI') == '1'
+
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'mainapp.metrics.TimedDjangoTemplates',
         'DIRS': [],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -83,16 +89,33 @@ WSGI_APPLICATION = 'shop.wsgi.application'
 
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.postgresql_psycopg2',
+        'ENGINE': 'mainapp.db.backends.postgresql_pool',
         'NAME': 'ecom_db',
         'USER': 'ecom_user',
         'PASSWORD': 'devpass',
         'HOST':'127.0.0.1',
-        'PORT': '5432'
+        'PORT': '5432',
+        # Per-process pool; keep workers * MAX_SIZE below max_connections.
+        'POOL': {
+            'MAX_SIZE': 10,
+            'TIMEOUT': 5,
+            'MAX_LIFETIME': 1800,
+            'MAX_IDLE': 300,
+            'CHECK_AFTER': 30,
+        }
     }
 }
 
 
+# Catalog and order-history reads go to DATABASE_REPLICAS when any are set,
+# e.g. DATABASES['replica'] = {..., 'TEST': {'MIRROR': 'default'}}.
+# After a cart, order or account write the visitor reads from the primary for
+# PRIMARY_STICKY_SECONDS.
+DATABASE_ROUTERS = ['mainapp.db.routers.PrimaryReplicaRouter']
+DATABASE_REPLICAS = []
+PRIMARY_STICKY_SECONDS = 15
+
+
 # Password validation
 # https://docs.djangoproject.com/en/3.1/ref/settings/#auth-password-validators
 
@@ -141,3 +164,36 @@ STATICFILES_DIRS = [
 
 # django_crispy_form settings
 CRISPY_TEMPLATE_PACK = 'bootstrap4'
+
+# Cache
+# https://docs.djangoproject.com/en/3.1/topics/cache/
+
+# The catalog cache keeps a per-process LRU in front of this backend, so it
+# has to be shared between workers for invalidation to reach all of them.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': '/var/tmp/shop_cache',
+    }
+}
+
+# Part of the catalog ETag, so a deploy does not revalidate stale pages.
+# Defaults to a fingerprint of the application's code and templates.
+BUILD_VERSION = os.environ.get('SHOP_BUILD_VERSION', '')
+
+CATALOG_CACHE = {
+    'maxsize': 256,
+    'timeout': 300,
+    'version_check_interval': 1,
+}
+
+# Prometheus metrics: each worker flushes its counters to METRICS_DIR at most
+# every METRICS_FLUSH_INTERVAL seconds and /metrics sums all workers' files.
+# Without SHOP_METRICS_DIR nothing is flushed and /metrics shows only the
+# worker that answers it.
+METRICS_DIR = os.environ.get('SHOP_METRICS_DIR', '')
+METRICS_FLUSH_INTERVAL = 5
+# /metrics answers only these addresses, or requests sending
+# "Authorization: Bearer <SHOP_METRICS_TOKEN>".
+METRICS_ALLOWED_IPS = ('127.0.0.1', '::1')
+METRICS_TOKEN = os.environ.get('SHOP_METRICS_TOKEN', '')
@@ -0,0 +1,12 @@
+from .settings import *  # noqa: F401,F403
+
+# The replica alias mirrors the primary test database, so the tests run the
+# read/write split of PrimaryReplicaRouter without a second server.
+DATABASES['replica'] = {
+    **DATABASES['default'],
+    'TEST': {'MIRROR': 'default'},
+}
+DATABASE_REPLICAS = ['replica']
+
+# Tests never flush metrics to disk, whatever the environment says.
+METRICS_DIR = ''